@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -87,6 +88,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than SQLite's in-memory database, which fails the writes of the
+        # concurrency tests' threads instead of letting them wait for each other's locks.
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'myschool-test.sqlite3')},
     }
 }
 
@@ -100,6 +104,49 @@ DATABASES = {
 #     }
 # }
 
+# The current semester and prerequisite graph version stamps are shared by every worker through
+# the default cache, so it must not be a per-process backend such as LocMemCache. Redis is used
+# when REDIS_URL is set (it needs the redis package), otherwise the database cache table created
+# by the school migrations (or `python manage.py createcachetable`). The database cache culls a
+# tenth of its keys, in key order, once it holds MAX_ENTRIES, so keep it well above the number of
+# grade templates, attendance summaries and course statistics cached at a time; a culled version
+# stamp makes every worker reload.
+# The passed-course sets of the students only pay off in Redis: in the database cache each lookup
+# costs more queries than the indexed Grade query it saves, so they are not cached without it.
+# The progress of running grade imports must not go to the database either: it would be written
+# inside the import transaction and stay invisible until the job ends. Without Redis it goes to
+# files, shared by the processes of one host only.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+        'passed_courses': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+        'grade_imports': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'myschool_cache',
+            'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 10},
+        },
+        'passed_courses': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        },
+        'grade_imports': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tempfile.gettempdir(), 'myschool-grade-imports'),
+        },
+    }
+
 
 
 # Password validation
@@ -193,6 +240,12 @@ EMAIL_POST_PASSWORD = 'xfzpmntxypfxxqvn'
 EMAIL_USE_TLS = True
 
 
+# Number of background threads importing uploaded grade sheets, 0 runs imports inline.
+GRADE_IMPORT_WORKERS = 2
+# Seconds after which a running grade import is considered dead and requeued by run_grade_imports.
+GRADE_IMPORT_TIMEOUT = 60 * 60
+
+
 #DEBUG TOOLBAR IP
 INTERNAL_IPS = [
     "127.0.0.1",
@@ -0,0 +1,89 @@
+"""
+Score distributions of a course or section, computed with NumPy and cached until the grades change.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import receiver
+from . import models, utility
+from .grading import GRADE_COMPONENTS, get_component_limits
+from .signals import grades_written
+
+LETTERS = ['A', 'B', 'C', 'D', 'F', 'I', 'NG']
+PERCENTILES = [10, 25, 50, 75, 90]
+HISTOGRAM_BINS = 10
+
+
+def statistics_cache_key(course_id, section_id, semester_id):
+    # section_id is None for the statistics of every section of the course.
+    return f'grade-statistics:{semester_id}:{course_id}:{section_id or "all"}'
+
+
+def describe(scores):
+    if not scores.size:
+        return None
+    return {
+        'mean': round(float(scores.mean()), 2),
+        'median': round(float(np.median(scores)), 2),
+        'std': round(float(scores.std()), 2),
+        'min': float(scores.min()),
+        'max': float(scores.max()),
+        'percentiles': dict(zip(PERCENTILES, np.percentile(scores, PERCENTILES).round(2).tolist())),
+    }
+
+
+def histogram(scores, limit):
+    counts, edges = np.histogram(scores, bins=HISTOGRAM_BINS, range=(0, limit))
+    return [{'from': round(float(start), 2), 'to': round(float(end), 2), 'count': int(count)}
+            for start, end, count in zip(edges[:-1], edges[1:], counts)]
+
+
+def compute_statistics(grades):
+    """
+    Fetches the numeric columns of a Grade queryset in one query and describes them.
+    Score statistics only cover final grades, the letter histogram covers every grade.
+    """
+    rows = list(grades.values_list('letter', 'total_score', *GRADE_COMPONENTS))
+    letters = np.array([row[0] for row in rows], dtype=object)
+    scores = np.array([row[1:] for row in rows], dtype=float).reshape(len(rows), len(GRADE_COMPONENTS) + 1)
+    graded = scores[~np.isin(letters, utility.UNGRADED_LETTERS)]
+
+    found_letters, letter_counts = np.unique(letters, return_counts=True)
+    letter_histogram = dict.fromkeys(LETTERS, 0)
+    letter_histogram.update(zip(found_letters.tolist(), letter_counts.tolist()))
+
+    limits = get_component_limits()
+    return {
+        'count': len(rows),
+        'graded_count': len(graded),
+        'total_score': describe(graded[:, 0]),
+        'total_score_histogram': histogram(graded[:, 0], 100),
+        'letters': letter_histogram,
+        'components': {
+            component: {**(describe(graded[:, i + 1]) or {}),
+                        'histogram': histogram(graded[:, i + 1], limits[component])}
+            for i, component in enumerate(GRADE_COMPONENTS)
+        },
+    }
+
+
+def get_statistics(course_id, semester_id, section_id=None):
+    key = statistics_cache_key(course_id, section_id, semester_id)
+    statistics = cache.get(key)
+    if statistics is None:
+        grades = models.Grade.objects.filter(course_id=course_id, semester_id=semester_id)
+        if section_id:
+            grades = grades.filter(section_id=section_id)
+        statistics = compute_statistics(grades)
+        cache.set(key, statistics, timeout=60 * 60 * 24)
+    return statistics
+
+
+@receiver(grades_written, dispatch_uid='invalidate_grade_statistics')
+def invalidate_statistics(sender, grades, **kwargs):
+    keys = set()
+    for course_id, section_id, semester_id in grades.values_list('course_id', 'section_id', 'semester_id').distinct():
+        keys.add(statistics_cache_key(course_id, section_id, semester_id))
+        keys.add(statistics_cache_key(course_id, None, semester_id))
+    # Dropped once the grades are committed, so a request in between cannot cache the old ones again.
+    transaction.on_commit(lambda: cache.delete_many(keys))
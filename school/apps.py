@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SchoolConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'school'
+
+    def ready(self):
+        # Connects the grades_written, Course, Section and Attendance receivers and the cache checks.
+        from . import analytics, attendance, jobs, prerequisites, registration, summaries  # noqa: F401
@@ -0,0 +1,378 @@
+"""
+Attendance marks of a section, validated and written a whole class at a time, and
+archived into one packed row per section and day once their semester is closed.
+"""
+import base64
+import binascii
+import datetime
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import models
+from .grading import get_component_limits
+
+UNMARKED = models.SectionAttendanceDay.UNMARKED
+MARKS = [mark for mark, _ in models.Attendance.MARK_CHOICES]
+# How much each mark counts towards the attendance rate, excused absences are not held against the student.
+MARK_WEIGHTS = {models.Attendance.P: 1, models.Attendance.E: 1, models.Attendance.T: 0.5, models.Attendance.A: 0}
+SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class AttendanceError(Exception):
+    pass
+
+
+# The related model of every id field of a mark and the field the id is looked up on.
+RELATED_MODELS = {
+    'student': (models.Student, 'user_id'),
+    'school_year': (models.SchoolYear, 'id'),
+    'semester': (models.Semester, 'id'),
+    'course': (models.Course, 'id'),
+}
+
+
+def find_mark_errors(section_id, marks):
+    """
+    Checks the marks, serializers.AttendanceMarkSerializer data, with one query per related
+    model and one for the marks already taken. Returns {index: {field: [errors]}}.
+    """
+    found = {
+        field: set(model.objects.filter(**{f'{key}__in': {mark[field] for mark in marks}})
+                   .values_list(key, flat=True))
+        for field, (model, key) in RELATED_MODELS.items()
+    }
+    section_course = models.Section.objects.filter(id=section_id).values_list('course_id', flat=True).first()
+    dates = {mark['date'] for mark in marks}
+    marked = set(models.Attendance.objects.filter(
+        section_id=section_id, student_id__in=found['student'], date__in=dates,
+    ).values_list('student_id', 'date'))
+    archived = set(models.SectionAttendanceDay.objects.filter(
+        section_id=section_id, date__in=dates).values_list('date', flat=True))
+
+    errors, seen = {}, set()
+    for index, mark in enumerate(marks):
+        mark_errors = {}
+        for field in RELATED_MODELS:
+            if mark[field] not in found[field]:
+                mark_errors[field] = [f'Invalid pk "{mark[field]}" - object does not exist.']
+        if mark['section'] != section_id or section_course is None:
+            mark_errors['section'] = ['Marks can only be taken for the section of the URL']
+        elif mark['course'] != section_course and 'course' not in mark_errors:
+            mark_errors['course'] = ['Section does not belong to the course']
+        key = (mark['student'], mark['date'])
+        if mark['date'] in archived:
+            mark_errors['date'] = ['The attendance of this day is archived']
+        elif key in marked:
+            mark_errors.setdefault('student', []).append('Student is already marked for this day')
+        elif key in seen:
+            mark_errors.setdefault('student', []).append('Student is marked twice in the list')
+        seen.add(key)
+        if mark_errors:
+            errors[index] = mark_errors
+    return errors
+
+
+def bulk_mark_attendance(section_id, marks):
+    """
+    Creates the marks of a section with one bulk insert, all of them or none. Marks without
+    a section or date are for the given section, today. Returns (attendances, errors).
+    """
+    today = timezone.localdate()
+    marks = [{'section': section_id, 'date': today, 'comment': None, **mark} for mark in marks]
+    errors = find_mark_errors(section_id, marks)
+    if errors:
+        return [], errors
+
+    attendances = [
+        models.Attendance(
+            student_id=mark['student'], school_year_id=mark['school_year'], semester_id=mark['semester'],
+            course_id=mark['course'], section_id=section_id, mark=mark['mark'], comment=mark['comment'],
+            date=mark['date'])
+        for mark in marks
+    ]
+    try:
+        with transaction.atomic():
+            models.Attendance.objects.bulk_create(attendances)
+            invalidate_summaries({(section_id, mark['semester']) for mark in marks})
+    except IntegrityError:
+        raise AttendanceError('Some of the students were marked meanwhile, reload the attendance')
+    return attendances, {}
+
+
+def get_roster(section_id, semester_id):
+    """
+    The student ids of a section's archived marks, by roster position.
+    """
+    return list(models.AttendanceRosterEntry.objects.filter(section_id=section_id, semester_id=semester_id)
+                .order_by('position').values_list('student_id', flat=True))
+
+
+def pack_marks(packed, positions, marks):
+    """
+    Writes {student_id: mark} into a packed marks string at the students' roster positions.
+    Days packed before the roster grew are shorter, the missing positions are unmarked.
+    """
+    packed = list(packed.ljust(max(positions.values(), default=-1) + 1, UNMARKED))
+    for student_id, mark in marks.items():
+        packed[positions[student_id]] = mark
+    return ''.join(packed)
+
+
+def pack_mark_ids(packed, positions, mark_ids):
+    """
+    Writes {student_id: Attendance id} into the comma separated ids of a day like pack_marks,
+    unmarked positions are left empty.
+    """
+    packed = packed.split(',') if packed else []
+    packed += [''] * (max(positions.values(), default=-1) + 1 - len(packed))
+    for student_id, mark_id in mark_ids.items():
+        packed[positions[student_id]] = str(mark_id)
+    return ','.join(packed)
+
+
+def unpack_marks(roster, packed):
+    return {student_id: mark for student_id, mark in zip(roster, packed) if mark != UNMARKED}
+
+
+def archive_section(section_id, semester_id, rows):
+    """
+    Packs an Attendance queryset of one section and semester into its archived days,
+    merging into days archived earlier, and deletes the rows. Returns (rows, days) written.
+    """
+    rows = list(rows.order_by('id').values_list('id', 'student_id', 'date', 'mark', 'comment', 'created_at'))
+    if not rows:
+        return 0, 0
+
+    roster = get_roster(section_id, semester_id)
+    positions = {student_id: position for position, student_id in enumerate(roster)}
+    newcomers = {student_id: len(positions) + i
+                 for i, student_id in enumerate(sorted({row[1] for row in rows} - positions.keys()))}
+    models.AttendanceRosterEntry.objects.bulk_create([
+        models.AttendanceRosterEntry(section_id=section_id, semester_id=semester_id, student_id=student_id,
+                                     position=position)
+        for student_id, position in newcomers.items()])
+    positions.update(newcomers)
+
+    by_date = {}
+    for mark_id, student_id, date, mark, comment, created_at in rows:
+        by_date.setdefault(date, []).append((student_id, mark, comment, created_at, mark_id))
+    days = {day.date: day for day in models.SectionAttendanceDay.objects.filter(
+        section_id=section_id, date__in=by_date)}
+    new_days, changed_days = [], []
+    for date, marks in by_date.items():
+        day = days.get(date)
+        if day is None:
+            day = days[date] = models.SectionAttendanceDay(
+                section_id=section_id, semester_id=semester_id, date=date, marks='',
+                created_at=min(created_at for *_, created_at, _ in marks))
+            new_days.append(day)
+        else:
+            changed_days.append(day)
+        day.marks = pack_marks(day.marks, positions, {student_id: mark for student_id, mark, *_ in marks})
+        day.mark_ids = pack_mark_ids(
+            day.mark_ids, positions, {student_id: mark_id for student_id, *_, mark_id in marks})
+    models.SectionAttendanceDay.objects.bulk_create(new_days)
+    models.SectionAttendanceDay.objects.bulk_update(changed_days, ['marks', 'mark_ids'], batch_size=500)
+
+    models.AttendanceDayComment.objects.bulk_create([
+        models.AttendanceDayComment(day=days[date], student_id=student_id, comment=comment)
+        for date, marks in by_date.items() for student_id, _, comment, *_ in marks if comment
+    ], update_conflicts=True, unique_fields=['day', 'student'], update_fields=['comment'])
+    models.Attendance.objects.filter(section_id=section_id, semester_id=semester_id, id__in=[row[0] for row in rows])\
+        .delete()
+    return len(rows), len(new_days) + len(changed_days)
+
+
+@transaction.atomic()
+def archive_semester(semester):
+    """
+    Archives the Attendance rows of a closed semester section by section. Rows whose course
+    or school year disagree with their section and semester cannot be rebuilt from an
+    archived day and are left in place. Returns (rows archived, days written, rows left).
+    """
+    rows = models.Attendance.objects.filter(semester=semester)
+    archivable = rows.filter(course_id=F('section__course_id'), school_year_id=semester.school_year_id)
+    archived = days = 0
+    for section_id in archivable.values_list('section_id', flat=True).distinct().order_by():
+        section_rows, section_days = archive_section(section_id, semester.id, archivable.filter(section_id=section_id))
+        archived += section_rows
+        days += section_days
+    return archived, days, rows.count()
+
+
+def expand_archived_days(days, student_id=None):
+    """
+    Unsaved Attendance instances of a SectionAttendanceDay queryset, of every student or one,
+    ordered by date and roster position, with every related object set so
+    ReadAttendanceSerializer needs no further queries. Archived marks keep the id they had
+    as Attendance rows, but their created_at and updated_at are the day's earliest created_at,
+    and they carry their roster_position for the history cursor.
+    """
+    days = list(days.select_related('semester__school_year', 'section__course').order_by('date', 'section_id'))
+    if not days:
+        return []
+    rosters = {}
+    roster_entries = models.AttendanceRosterEntry.objects.filter(
+        section_id__in={day.section_id for day in days}, semester_id__in={day.semester_id for day in days})
+    if student_id is not None:
+        roster_entries = roster_entries.filter(student_id=student_id)
+    for section_id, semester_id, position, entry_student_id in roster_entries.values_list(
+            'section_id', 'semester_id', 'position', 'student_id'):
+        rosters.setdefault((section_id, semester_id), {})[position] = entry_student_id
+    students = models.Student.objects.select_related('user').in_bulk(
+        {entry_student_id for roster in rosters.values() for entry_student_id in roster.values()})
+    comments = {(day_id, comment_student_id): comment for day_id, comment_student_id, comment in
+                models.AttendanceDayComment.objects.filter(day__in=days).values_list('day_id', 'student_id', 'comment')}
+
+    attendances = []
+    for day in days:
+        roster = rosters.get((day.section_id, day.semester_id), {})
+        mark_ids = day.mark_ids.split(',')
+        for position, mark in enumerate(day.marks):
+            if mark == UNMARKED or position not in roster:
+                continue
+            attendance = models.Attendance(
+                id=int(mark_ids[position]) if position < len(mark_ids) and mark_ids[position] else None,
+                student=students[roster[position]], school_year=day.semester.school_year, semester=day.semester,
+                course=day.section.course, section=day.section, mark=mark,
+                comment=comments.get((day.id, roster[position])), date=day.date,
+                created_at=day.created_at, updated_at=day.created_at)
+            attendance.roster_position = position
+            attendances.append(attendance)
+    return attendances
+
+
+# Within a day, archived marks come before the Attendance rows.
+ARCHIVED, LIVE = 0, 1
+
+
+def attendance_key(attendance):
+    """
+    The place of a mark in the attendance history: (date, ARCHIVED, roster position) or (date, LIVE, id).
+    """
+    if hasattr(attendance, 'roster_position'):
+        return attendance.date, ARCHIVED, attendance.roster_position
+    return attendance.date, LIVE, attendance.id
+
+
+def encode_cursor(key):
+    date, store, position = key
+    return base64.urlsafe_b64encode(f'{date.isoformat()}|{store}|{position}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    The key encoded by encode_cursor, raises ValueError for anything else.
+    """
+    try:
+        date, store, position = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        key = datetime.date.fromisoformat(date), int(store), int(position)
+    except (TypeError, UnicodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+    if key[1] not in (ARCHIVED, LIVE):
+        raise ValueError('Unknown cursor')
+    return key
+
+
+def count_filling_days(days, wanted):
+    """
+    How many of the (id, date, marks) days it takes to hold wanted marks.
+    """
+    for count, (*_, marks) in enumerate(days, start=1):
+        wanted -= len(marks) - marks.count(UNMARKED)
+        if wanted <= 0:
+            return count
+    return len(days)
+
+
+def page_attendance_history(rows, days, size, after=None, student_id=None):
+    """
+    The size marks following the key after in the attendance history of Attendance rows and
+    archived SectionAttendanceDay rows, both querysets already filtered, and whether more
+    follow. Both are read from the position after on the (section, date) indexes, so a
+    deep page costs as much as the first.
+    """
+    if after:
+        date, store, position = after
+        if store == LIVE:
+            rows = rows.filter(Q(date__gt=date) | Q(date=date, id__gt=position))
+            days = days.filter(date__gt=date)
+        else:
+            rows = rows.filter(date__gte=date)
+            days = days.filter(date__gte=date)
+    page = list(rows.order_by('date', 'id')[:size + 1])
+
+    # Days hold any number of marks for the page, down to none with a student filter, so
+    # they are read in batches and only the days up to the one that fills the page are expanded.
+    archived = []
+    while len(archived) <= size:
+        batch = list(days.order_by('date').values_list('id', 'date', 'marks')[:size + 1])
+        expanded = batch if student_id is not None else batch[:count_filling_days(batch, size + 1 - len(archived))]
+        archived += [attendance for attendance in expand_archived_days(
+                     days.filter(id__in=[day_id for day_id, *_ in expanded]), student_id=student_id)
+                     if not after or attendance_key(attendance) > after]
+        if len(expanded) == len(batch) and len(batch) <= size:
+            break
+        days = days.filter(date__gt=expanded[-1][1])
+    page = sorted(page + archived, key=attendance_key)
+    return page[:size], len(page) > size
+
+
+def summary_cache_key(section_id, semester_id):
+    return f'attendance-summary:{semester_id}:{section_id}'
+
+
+def summarize_counts(counts, limit):
+    total = sum(counts.values())
+    rate = sum(MARK_WEIGHTS[mark] * count for mark, count in counts.items()) / total if total else 0
+    return {**counts, 'total': total, 'rate': round(rate, 4), 'score': round(rate * limit, 2)}
+
+
+def compute_attendance_summary(section_id, semester_id):
+    """
+    {student_id: {P, A, E, T, total, rate, score}} of a section in a semester, counted with one
+    GROUP BY over the marks plus the archived days if the semester is archived. score is
+    the rate scaled to the attendance component of Grade.
+    """
+    counts = {}
+    rows = models.Attendance.objects.filter(section_id=section_id, semester_id=semester_id)\
+        .values('student_id').annotate(**{mark: Count('id', filter=Q(mark=mark)) for mark in MARKS}).order_by()
+    for row in rows:
+        counts[row.pop('student_id')] = row
+
+    days = models.SectionAttendanceDay.objects.filter(section_id=section_id, semester_id=semester_id)
+    packed_days = list(days.values_list('marks', flat=True))
+    if packed_days:
+        roster = get_roster(section_id, semester_id)
+        for packed in packed_days:
+            for student_id, mark in unpack_marks(roster, packed).items():
+                counts.setdefault(student_id, dict.fromkeys(MARKS, 0))[mark] += 1
+
+    limit = float(get_component_limits()['attendance'])
+    return {student_id: summarize_counts(student_counts, limit) for student_id, student_counts in counts.items()}
+
+
+def get_attendance_summary(section_id, semester_id):
+    key = summary_cache_key(section_id, semester_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_attendance_summary(section_id, semester_id)
+        cache.set(key, summary, timeout=SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_summaries(sections):
+    """
+    Drops the cached summaries of the (section_id, semester_id) pairs once the marks are committed.
+    """
+    keys = [summary_cache_key(section_id, semester_id) for section_id, semester_id in sections]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_save, sender=models.Attendance, dispatch_uid='invalidate_attendance_summary_on_save')
+@receiver(post_delete, sender=models.Attendance, dispatch_uid='invalidate_attendance_summary_on_delete')
+def invalidate_summary(sender, instance, **kwargs):
+    invalidate_summaries([(instance.section_id, instance.semester_id)])
@@ -38,4 +38,26 @@ class StudentFilter(FilterSet):
         fields = {
             'department_id': ['exact'],
             'major_id': ['exact'],
-        }
\ No newline at end of file
+        }
+
+class AcademicSummaryFilter(FilterSet):
+    class Meta:
+        model = models.StudentAcademicSummary
+        fields = {
+            'gpa': ['gte', 'lte'],
+            'earned_credits': ['gte', 'lte'],
+            'student__department_id': ['exact'],
+            'student__major_id': ['exact'],
+            'student__level': ['exact'],
+        }
+
+
+class SemesterSummaryFilter(FilterSet):
+    class Meta:
+        model = models.StudentSemesterSummary
+        fields = {
+            'gpa': ['gte', 'lte'],
+            'attempted_credits': ['gte'],
+            'student__department_id': ['exact'],
+            'student__major_id': ['exact'],
+        }
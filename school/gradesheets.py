@@ -0,0 +1,132 @@
+import csv
+import io
+import os
+import tempfile
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+# The rows above the student records, in the order teachers fill them in.
+HEADER_ROWS = ['semester', 'school_year', 'course', 'section', 'student_record_header']
+STUDENT_RECORD_HEADER = ['Student Number', 'Attendance', 'Assignment', 'Quiz', 'Midterm', 'Project', 'Final', 'Name']
+
+
+def iter_sheet_rows(grades_file):
+    """
+    Yields the rows of an uploaded .xlsx or .csv file one at a time without loading the whole file.
+    """
+    _, extension = os.path.splitext(grades_file.name)
+    if extension.lower() == '.csv':
+        grades_file.seek(0)
+        yield from csv.reader(io.TextIOWrapper(grades_file, encoding='utf-8-sig', newline=''))
+        return
+
+    workbook = load_workbook(grades_file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+class GradeSheetReader:
+    """
+    Streams a grade sheet in a single pass: the header rows are read up front and the
+    student rows are handed out as small DataFrames of at most chunk_size rows, indexed
+    by their row position in the sheet.
+    """
+
+    def __init__(self, grades_file, excluded_indexes=range(len(HEADER_ROWS)), chunk_size=500):
+        self.rows = enumerate(iter_sheet_rows(grades_file))
+        self.chunk_size = chunk_size
+        self.header = {}
+        for index, row in self.rows:
+            if index in excluded_indexes and index < len(HEADER_ROWS):
+                self.header[HEADER_ROWS[index]] = row[1] if len(row) > 1 else None
+            if index >= max(excluded_indexes):
+                break
+
+    def chunks(self):
+        indexes, chunk = [], []
+        for index, row in self.rows:
+            if not row or row[0] in (None, ''):
+                continue
+            indexes.append(index)
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield pd.DataFrame(chunk, index=indexes)
+                indexes, chunk = [], []
+        if chunk:
+            yield pd.DataFrame(chunk, index=indexes)
+
+
+def write_grade_template(teach, students, attendance_scores=None):
+    """
+    Builds the upload sheet of a teach: the header rows GradeSheetReader expects followed
+    by one row per (student_number, first_name, last_name) with empty grade cells, except
+    for the attendance scores given as {student_number: score}. Returns the .xlsx content.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Grades')
+    sheet.append(['Semester', teach.semester.name])
+    sheet.append(['School Year', teach.school_year.year])
+    sheet.append(['Course', teach.course.code])
+    sheet.append(['Section', teach.section.name])
+    sheet.append(STUDENT_RECORD_HEADER)
+    empty_grades = [None] * (len(STUDENT_RECORD_HEADER) - 3)
+    attendance_scores = attendance_scores or {}
+    for student_number, first_name, last_name in students:
+        sheet.append([student_number, attendance_scores.get(student_number), *empty_grades,
+                      f'{first_name} {last_name}'])
+
+    content = io.BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+GRADEBOOK_HEADER = ['Student Number', 'First Name', 'Last Name', 'School Year', 'Semester', 'Course',
+                    'Section', 'Attendance', 'Assignment', 'Quiz', 'Midterm', 'Project', 'Final',
+                    'Total Score', 'Letter', 'Grade Point']
+GRADEBOOK_FIELDS = ['student__student_number', 'student__user__first_name', 'student__user__last_name',
+                    'school_year__year', 'semester__name', 'course__code', 'section__name',
+                    'attendance', 'assignment', 'quiz', 'midterm', 'project', 'final',
+                    'total_score', 'letter', 'grade_point']
+
+
+def iter_gradebook_rows(grades, chunk_size=2000):
+    """
+    Yields the gradebook rows of a Grade queryset, fetching chunk_size rows at a time with a single joined query.
+    """
+    return grades.order_by('course__code', 'section__name', 'student__student_number', 'id')\
+        .values_list(*GRADEBOOK_FIELDS).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """
+    A file-like object whose write() returns the value, so csv.writer can feed a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_gradebook_csv(grades):
+    writer = csv.writer(Echo())
+    yield writer.writerow(GRADEBOOK_HEADER)
+    for row in iter_gradebook_rows(grades):
+        yield writer.writerow(row)
+
+
+def write_gradebook_xlsx(grades):
+    """
+    Writes the gradebook with an openpyxl write-only workbook, which spills rows to disk
+    instead of keeping them in memory, and returns the saved file rewound for reading.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Gradebook')
+    sheet.append(GRADEBOOK_HEADER)
+    for row in iter_gradebook_rows(grades):
+        sheet.append(row)
+
+    gradebook_file = tempfile.TemporaryFile()
+    workbook.save(gradebook_file)
+    gradebook_file.seek(0)
+    return gradebook_file
@@ -0,0 +1,274 @@
+import pandas as pd
+from django.core.validators import MaxValueValidator
+from django.db import IntegrityError, transaction
+from django.db.models import Case, FilteredRelation, Q, Sum, Value, When
+from django.utils import timezone
+from rest_framework import status
+from . import models, semesters, utility
+from .signals import grades_written
+
+# Order of the grade columns in the uploaded spreadsheet, right after the student number.
+GRADE_COMPONENTS = ['attendance', 'assignment', 'quiz', 'midterm', 'project', 'final']
+
+
+class GradeImportError(Exception):
+    def __init__(self, error, status_code=status.HTTP_400_BAD_REQUEST, rows=None):
+        super().__init__(error)
+        self.error = error
+        self.status_code = status_code
+        self.rows = rows
+
+    def as_dict(self):
+        if self.rows:
+            return {'error': self.error, 'rows': self.rows}
+        return {'error': self.error}
+
+
+def get_component_limits():
+    """
+    The maximum score of every grade component, taken from the Grade model validators.
+    """
+    limits = {}
+    for component in GRADE_COMPONENTS:
+        validators = models.Grade._meta.get_field(component).validators
+        limits[component] = next(
+            validator.limit_value for validator in validators if isinstance(validator, MaxValueValidator))
+    return limits
+
+
+def get_roster_enrollments(teach):
+    """
+    The approved enrollments of the teach's course and section in the current semester.
+    """
+    return models.Enrollment.objects.filter(
+        course_id=teach.course_id, section_id=teach.section_id, semester_id=semesters.current_semester_id(),
+        status=models.Enrollment.APPROVED)
+
+
+def get_roster(teach):
+    """
+    Returns {student_number: student_id} for every student enrolled in the teach, in one query.
+    """
+    return dict(get_roster_enrollments(teach).values_list('student__student_number', 'student_id'))
+
+
+def get_roster_grades(teach):
+    """
+    Like get_roster but also returns the grades the roster already has for the teach as
+    {student_id: {'id': ..., 'attendance': ..., ...}}, all in one query.
+    """
+    students = models.Student.objects.filter(
+        user_id__in=get_roster_enrollments(teach).values('student_id'),
+    ).annotate(teach_grade=FilteredRelation('grades', condition=Q(
+        grades__course_id=teach.course_id, grades__section_id=teach.section_id,
+        grades__semester_id=teach.semester_id)))
+    columns = ['teach_grade__id'] + [f'teach_grade__{component}' for component in GRADE_COMPONENTS]
+
+    roster, existing = {}, {}
+    for student_number, student_id, *grade in students.values_list('student_number', 'user_id', *columns):
+        roster[student_number] = student_id
+        if grade[0] is not None:
+            existing[student_id] = dict(zip(['id'] + GRADE_COMPONENTS, grade))
+    return roster, existing
+
+
+def normalize_student_numbers(column):
+    return column.astype(str).str.strip()
+
+
+def validate_scores(student_rows):
+    """
+    Validates every grade cell of the student rows at once and returns (scores, errors).
+    scores is a DataFrame with one column per grade component and errors maps the
+    spreadsheet row number to the list of invalid components of that row.
+    """
+    limits = get_component_limits()
+    scores = student_rows.iloc[:, 1:len(GRADE_COMPONENTS) + 1]
+    scores.columns = GRADE_COMPONENTS[:len(scores.columns)]
+    scores = scores.reindex(columns=GRADE_COMPONENTS)
+    scores = scores.apply(pd.to_numeric, errors='coerce').round(2)
+
+    invalid = scores.isna() | (scores < 0) | (scores > pd.Series(limits))
+    errors = {
+        int(index) + 1: [component for component in GRADE_COMPONENTS if row[component]]
+        for index, row in invalid[invalid.any(axis=1)].iterrows()
+    }
+    return scores, errors
+
+
+def build_grades(teach, student_ids, scores):
+    grades = []
+    for student_id, row in zip(student_ids, scores.itertuples(index=False)):
+        grade = models.Grade(
+            school_year_id=teach.school_year_id, semester_id=teach.semester_id,
+            course_id=teach.course_id, section_id=teach.section_id, student_id=student_id,
+            **dict(zip(GRADE_COMPONENTS, row)))
+        grade.refresh_scores(teach.course.credit)
+        grades.append(grade)
+    return grades
+
+
+def get_teach_grades(teach, student_ids):
+    return models.Grade.objects.filter(
+        course_id=teach.course_id, section_id=teach.section_id, semester_id=teach.semester_id,
+        student_id__in=list(student_ids))
+
+
+def bulk_create_grades(teach, student_ids, scores):
+    try:
+        with transaction.atomic():
+            grades = models.Grade.objects.bulk_create(build_grades(teach, student_ids, scores))
+    except IntegrityError:
+        raise GradeImportError('Grades were already uploaded for this section, re-upload the sheet in upsert mode',
+                               status.HTTP_409_CONFLICT)
+    grades_written.send(sender=models.Grade, grades=get_teach_grades(teach, student_ids))
+    return grades
+
+
+def upsert_grades(teach, students, student_ids, scores, existing, report):
+    """
+    Inserts the grades of new students and bulk updates only the changed components of
+    the others, recording every change in report.
+    """
+    new_ids, new_scores = [], []
+    changed_grades, changed_fields = [], set()
+    now = timezone.now()
+
+    for student_number, student_id, row in zip(students, student_ids, scores.itertuples(index=False)):
+        current = existing.get(student_id)
+        if current is None:
+            new_ids.append(student_id)
+            new_scores.append(row)
+            report['created'].append(student_number)
+            continue
+
+        changes = {
+            component: [float(current[component]), value]
+            for component, value in zip(GRADE_COMPONENTS, row) if float(current[component]) != value
+        }
+        if not changes:
+            report['unchanged'] += 1
+            continue
+        grade = models.Grade(id=current['id'], updated_at=now, **{
+            component: changes[component][1] if component in changes else current[component]
+            for component in GRADE_COMPONENTS})
+        grade.refresh_scores(teach.course.credit)
+        changed_grades.append(grade)
+        changed_fields.update(changes)
+        report['updated'][student_number] = changes
+
+    if new_ids:
+        bulk_create_grades(teach, new_ids, pd.DataFrame(new_scores, columns=GRADE_COMPONENTS))
+    if changed_grades:
+        models.Grade.objects.bulk_update(
+            changed_grades, [*changed_fields, *models.Grade.COMPUTED_FIELDS, 'updated_at'])
+        grades_written.send(sender=models.Grade, grades=models.Grade.objects.filter(
+            id__in=[grade.id for grade in changed_grades]))
+
+
+@transaction.atomic()
+def import_grades(teach, reader, progress=None, upsert=False):
+    """
+    Validates and inserts the grades of a GradeSheetReader chunk by chunk. Nothing is
+    saved unless the whole sheet is valid and lists exactly the enrolled students.
+    With upsert the sheet is diffed against the grades already saved for the teach.
+    progress, if given, is called with the number of rows processed after every chunk.
+    Returns a report of the created, updated and unchanged grades by student number.
+    """
+    if upsert:
+        roster, existing = get_roster_grades(teach)
+    else:
+        roster = get_roster(teach)
+    seen_students = set()
+    errors = {}
+    report = {'created': [], 'updated': {}, 'unchanged': 0}
+
+    for chunk in reader.chunks():
+        students = normalize_student_numbers(chunk[0])
+        if not students.isin(roster.keys()).all():
+            raise GradeImportError('Unknown student found in spreadsheet', status.HTTP_403_FORBIDDEN)
+        if students.duplicated().any() or not seen_students.isdisjoint(students):
+            raise GradeImportError('Incomplete students listing', status.HTTP_401_UNAUTHORIZED)
+        seen_students.update(students)
+
+        scores, chunk_errors = validate_scores(chunk)
+        errors.update(chunk_errors)
+        if not errors and upsert:
+            upsert_grades(teach, students, students.map(roster), scores, existing, report)
+        elif not errors:
+            bulk_create_grades(teach, students.map(roster), scores)
+            report['created'].extend(students)
+        if progress:
+            progress(len(seen_students))
+
+    if len(seen_students) != len(roster):
+        raise GradeImportError('Incomplete students listing', status.HTTP_401_UNAUTHORIZED)
+    if errors:
+        raise GradeImportError('Invalid grades found in spreadsheet', rows=errors)
+    return report
+
+
+def gpa(quality_points, attempted_credits):
+    if not attempted_credits:
+        return 0
+    return round(quality_points / attempted_credits, 2)
+
+
+def get_semester_totals(grades, *group_by):
+    """
+    Credits and quality points of a Grade queryset per semester, and per any extra group_by
+    field, in one aggregated query. Only final grades count as attempted, see utility.UNGRADED_LETTERS.
+    """
+    graded = ~Q(letter__in=utility.UNGRADED_LETTERS)
+    return grades.values(
+        *group_by, 'school_year_id', 'school_year__year', 'semester_id', 'semester__name',
+    ).annotate(
+        attempted_credits=Sum('course__credit', filter=graded, default=0),
+        earned_credits=Sum(Case(
+            When(total_score__gte=utility.PASSING_SCORE, then='course__credit'), default=Value(0)),
+            filter=graded, default=0),
+        quality_points=Sum(utility.grade_point_expression('course__credit'), filter=graded, default=0),
+    ).order_by('school_year__year', 'semester__name')
+
+
+def build_transcript(student_id):
+    """
+    Semester, yearly and cumulative GPA and credits of a student.
+    """
+    semester_rows, years = [], {}
+    attempted = earned = quality_points = 0
+
+    for totals in get_semester_totals(models.Grade.objects.filter(student_id=student_id)):
+        attempted += totals['attempted_credits']
+        earned += totals['earned_credits']
+        quality_points += totals['quality_points']
+        semester_rows.append({
+            'school_year': totals['school_year__year'],
+            'semester_id': totals['semester_id'],
+            'semester': totals['semester__name'],
+            'attempted_credits': totals['attempted_credits'],
+            'earned_credits': totals['earned_credits'],
+            'quality_points': totals['quality_points'],
+            'gpa': gpa(totals['quality_points'], totals['attempted_credits']),
+            'cumulative_gpa': gpa(quality_points, attempted),
+        })
+
+        year = years.setdefault(totals['school_year__year'], {
+            'school_year': totals['school_year__year'],
+            'attempted_credits': 0, 'earned_credits': 0, 'quality_points': 0})
+        year['attempted_credits'] += totals['attempted_credits']
+        year['earned_credits'] += totals['earned_credits']
+        year['quality_points'] += totals['quality_points']
+
+    for year in years.values():
+        year['gpa'] = gpa(year['quality_points'], year['attempted_credits'])
+
+    return {
+        'student': int(student_id),
+        'semesters': semester_rows,
+        'years': list(years.values()),
+        'attempted_credits': attempted,
+        'earned_credits': earned,
+        'quality_points': quality_points,
+        'cumulative_gpa': gpa(quality_points, attempted),
+    }
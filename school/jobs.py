@@ -0,0 +1,134 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+from . import models, grading, gradesheets
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.GRADE_IMPORT_WORKERS, thread_name_prefix='grade-import')
+    return _executor
+
+
+def progress_cache_key(job_id):
+    return f'grade-import-job:{job_id}:rows'
+
+
+@checks.register(checks.Tags.caches)
+def check_progress_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('grade_imports', {}).get('BACKEND')
+    if backend in ['django.core.cache.backends.redis.RedisCache',
+                   'django.core.cache.backends.filebased.FileBasedCache']:
+        return []
+    return [checks.Warning(
+        f'The grade_imports cache {backend} cannot publish the progress of running grade imports, '
+        'a database cache writes it inside the import transaction and a per-process one hides it '
+        'from the other workers.',
+        hint='Use RedisCache or FileBasedCache for the grade_imports cache.',
+        id='school.W003')]
+
+
+def get_rows_processed(job):
+    """
+    Rows are inserted inside the import transaction, which would hide and roll back a progress
+    update of the job row, so a running job publishes its progress through the grade_imports
+    cache, which never uses the database. The row gets the count when the job finishes,
+    whatever its outcome.
+    """
+    if job.status == models.GradeImportJob.RUNNING:
+        return caches['grade_imports'].get(progress_cache_key(job.id), job.rows_processed)
+    return job.rows_processed
+
+
+def enqueue_grade_import(job):
+    """
+    Hands the job to the worker pool once the transaction that created it commits.
+    With GRADE_IMPORT_WORKERS = 0 the import runs inline instead.
+    """
+    if settings.GRADE_IMPORT_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(run_grade_import_in_worker, job.id))
+    else:
+        transaction.on_commit(lambda: run_grade_import(job.id))
+
+
+def run_grade_import_in_worker(job_id):
+    try:
+        run_grade_import(job_id)
+    finally:
+        connection.close()
+
+
+def run_grade_import(job_id):
+    claimed = models.GradeImportJob.objects.filter(id=job_id, status=models.GradeImportJob.PENDING)\
+        .update(status=models.GradeImportJob.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return
+
+    job = models.GradeImportJob.objects.select_related('teach__course').get(id=job_id)
+    key = progress_cache_key(job_id)
+
+    def report_progress(rows_processed):
+        job.rows_processed = rows_processed
+        caches['grade_imports'].set(key, rows_processed, timeout=60 * 60)
+
+    try:
+        with job.grades_file.open('rb') as grades_file:
+            reader = gradesheets.GradeSheetReader(grades_file)
+            job.report = grading.import_grades(
+                job.teach, reader, progress=report_progress, upsert=job.mode == models.GradeImportJob.UPSERT)
+        job.rows_processed = len(job.report['created']) + len(job.report['updated']) + job.report['unchanged']
+        job.status = models.GradeImportJob.SUCCEEDED
+    except grading.GradeImportError as e:
+        job.status = models.GradeImportJob.FAILED
+        job.errors = e.as_dict()
+    except Exception as e:
+        logger.exception('Grade import job %s failed', job_id)
+        job.status = models.GradeImportJob.FAILED
+        job.errors = {'error': str(e)}
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'rows_processed', 'errors', 'report', 'finished_at'])
+    caches['grade_imports'].delete(key)
+
+
+def requeue_stale_grade_imports(timeout=None):
+    """
+    Puts back in the queue the jobs still running after timeout seconds, GRADE_IMPORT_TIMEOUT
+    by default: their worker died, e.g. in a restart, before committing any grade since the
+    import is a single transaction. Returns the number of jobs requeued.
+    """
+    if timeout is None:
+        timeout = settings.GRADE_IMPORT_TIMEOUT
+    stale = models.GradeImportJob.objects.filter(
+        status=models.GradeImportJob.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=timeout))
+    job_ids = list(stale.values_list('id', flat=True))
+    requeued = models.GradeImportJob.objects.filter(id__in=job_ids, status=models.GradeImportJob.RUNNING)\
+        .update(status=models.GradeImportJob.PENDING, started_at=None, rows_processed=0)
+    caches['grade_imports'].delete_many([progress_cache_key(job_id) for job_id in job_ids])
+    for job_id in job_ids:
+        logger.warning('Grade import job %s was still running after %s seconds, requeued', job_id, timeout)
+    return requeued
+
+
+def run_pending_grade_imports(timeout=None):
+    """
+    Requeues the stale running jobs, then runs every pending job. Returns the number of
+    jobs requeued and run.
+    """
+    requeued = requeue_stale_grade_imports(timeout)
+    pending = list(models.GradeImportJob.objects.filter(
+        status=models.GradeImportJob.PENDING).order_by('created_at').values_list('id', flat=True))
+    for job_id in pending:
+        run_grade_import(job_id)
+    return requeued, len(pending)
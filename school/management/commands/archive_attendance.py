@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from school import attendance, models
+
+
+class Command(BaseCommand):
+    help = ('Packs the attendance marks of closed semesters into one row per section and day. '
+            'The marks are still listed by the section attendances endpoint but can no longer be edited.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('semesters', nargs='*', type=int,
+                            help='Semester ids, every semester but the current one by default.')
+
+    def handle(self, *args, **options):
+        semesters = models.Semester.objects.filter(is_current=False).select_related('school_year')
+        if options['semesters']:
+            semesters = semesters.filter(id__in=options['semesters'])
+            missing = set(options['semesters']) - {semester.id for semester in semesters}
+            if missing:
+                raise CommandError(f'Semesters {sorted(missing)} do not exist or are current')
+
+        for semester in semesters:
+            archived, days, left = attendance.archive_semester(semester)
+            if archived or left:
+                self.stdout.write(f'{semester}: archived {archived} marks into {days} days'
+                                  + (f', {left} marks left with another course or school year' if left else ''))
@@ -0,0 +1,52 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from school import models, prerequisites
+
+
+class Command(BaseCommand):
+    help = 'Writes the eligible courses of every student of a department or major as CSV.'
+
+    def add_arguments(self, parser):
+        owner = parser.add_mutually_exclusive_group(required=True)
+        owner.add_argument('--department', type=int)
+        owner.add_argument('--major', type=int)
+        parser.add_argument('--output', help='CSV file to write, standard output by default.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes, 0 computes everything in this process.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['department']:
+            students = models.Student.objects.filter(department_id=options['department'])
+        else:
+            students = models.Student.objects.filter(major_id=options['major'])
+        if not students.exists():
+            raise CommandError('No students found.')
+
+        offered, rows = prerequisites.load_eligibility_inputs(students)
+        graph = prerequisites.get_graph()
+        chunks = [rows[i:i + options['chunk_size']] for i in range(0, len(rows), options['chunk_size'])]
+        eligible = {}
+        if options['workers']:
+            with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+                for result in executor.map(prerequisites.eligible_courses_of_students,
+                                           itertools.repeat(graph), itertools.repeat(offered), chunks):
+                    eligible.update(result)
+        else:
+            for chunk in chunks:
+                eligible.update(prerequisites.eligible_courses_of_students(graph, offered, chunk))
+
+        codes = dict(models.Course.objects.values_list('id', 'code'))
+        output = open(options['output'], 'w', newline='') if options['output'] else self.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(['Student Number', 'Eligible Courses'])
+            for student_id, student_number in students.order_by('student_number').values_list(
+                    'user_id', 'student_number'):
+                writer.writerow([student_number, ' '.join(codes[course_id] for course_id in eligible[student_id])])
+        finally:
+            if options['output']:
+                output.close()
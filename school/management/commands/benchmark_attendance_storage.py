@@ -0,0 +1,109 @@
+import datetime
+import os
+import random
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.models import User
+from school import attendance, models, semesters
+from school.management.synthetic import scratch_database, seed_school
+
+ROW_TABLES = ['school_attendance']
+ARCHIVE_TABLES = ['school_sectionattendanceday', 'school_attendancerosterentry', 'school_attendancedaycomment']
+
+
+def table_bytes(tables):
+    # Pages of the tables and of their indexes, read from SQLite's dbstat virtual table.
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+        cursor.execute(
+            'SELECT SUM(d.pgsize) FROM dbstat d JOIN sqlite_master m ON m.name = d.name '
+            f'WHERE m.tbl_name IN ({", ".join(["%s"] * len(tables))})', tables)
+        return cursor.fetchone()[0] or 0
+
+
+def create_marks(school, days, comment_rate):
+    start = datetime.date(2023, 1, 16)
+    for section in school['sections']:
+        models.Attendance.objects.bulk_create([
+            models.Attendance(
+                student=student, school_year=school['school_year'], semester=school['semester'],
+                course_id=section.course_id, section=section, date=start + datetime.timedelta(days=day),
+                mark=random.choices('PAET', [85, 7, 4, 4])[0],
+                comment='Left early' if random.random() < comment_rate else None)
+            for day in range(days) for student in school['students']], batch_size=2000)
+
+
+def fetch_history(client, url):
+    """
+    Follows "next" until the last page, returns the rows of every page and the number of
+    queries they took. Each request resets the query log, so the pages are captured one by one.
+    """
+    rows, queries = [], 0
+    while url:
+        # The query log is capped, a full one would hide the queries of the request.
+        reset_queries()
+        with CaptureQueriesContext(connection) as page_queries:
+            response = client.get(url)
+        rows.extend(response.data['results'])
+        queries += len(page_queries)
+        url = response.data['next']
+    return rows, queries
+
+
+def comparable(rows):
+    # Archived marks share the earliest created_at of their day, everything else is kept.
+    return sorted(
+        (row['id'], row['student']['user']['id'], row['date'], row['mark'], row['comment'], row['course']['id'],
+         row['semester']['id'], row['school_year']['id']) for row in rows)
+
+
+class Command(BaseCommand):
+    help = ('Compares the storage and the section attendance listing of Attendance rows with the '
+            'archived one-row-per-section-and-day format on a scratch SQLite database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=60)
+        parser.add_argument('--sections', type=int, default=4)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--comment-rate', type=float, default=0.02)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory, \
+                scratch_database(os.path.join(directory, 'attendance.sqlite3')):
+            school = seed_school(students=options['students'], courses=options['sections'])
+            create_marks(school, options['days'], options['comment_rate'])
+            admin = User.objects.create_superuser('benchmark', 'benchmark@myschool.test', 'benchmark', is_active=True)
+            client = APIClient()
+            client.force_authenticate(admin)
+            url = f'/school/sections/{school["sections"][0].id}/attendances/?page_size={options["page_size"]}'
+
+            marks = models.Attendance.objects.count()
+            self.stdout.write(f'{marks} marks of {options["students"]} students in {options["sections"]} '
+                              f'sections over {options["days"]} days')
+            self.stdout.write(f'{"storage":>8} {"bytes":>12} {"bytes/mark":>11} {"queries":>8} {"ms/list":>8}')
+
+            before = self.measure(client, url, 'rows', ROW_TABLES, marks, options['repeat'])
+            models.Semester.objects.filter(id=school['semester'].id).update(is_current=False)
+            semesters.invalidate_current_semester()
+            start = time.perf_counter()
+            archived, days, _ = attendance.archive_semester(models.Semester.objects.get(id=school['semester'].id))
+            self.stdout.write(f'archived {archived} marks into {days} days in {time.perf_counter() - start:.2f}s')
+            after = self.measure(client, url, 'archive', ARCHIVE_TABLES, marks, options['repeat'])
+
+            self.stdout.write('listing unchanged: ' + ('yes' if comparable(before) == comparable(after) else 'NO'))
+
+    def measure(self, client, url, name, tables, marks, repeat):
+        size = table_bytes(tables)
+        rows, queries = fetch_history(client, url)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fetch_history(client, url)
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        self.stdout.write(f'{name:>8} {size:>12} {size / marks:>11.1f} {queries:>8} {elapsed:>8.1f}')
+        return rows
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.models import User
+from school.management.synthetic import scratch_database, seed_school
+
+
+class Command(BaseCommand):
+    help = 'Measures queries and wall time of the bulk enrollment endpoint on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 5000])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"items":>8} {"queries":>8} {"seconds":>9} {"created":>8}')
+        for size in options['sizes']:
+            with scratch_database():
+                school = seed_school(students=size, courses=2)
+                section = school['sections'][1]
+                section.capacity = size
+                section.save()
+                items = [{'student': student.user_id, 'course': section.course_id, 'section': section.id}
+                         for student in school['students']]
+                admin = User.objects.create_superuser(
+                    'benchmark', 'benchmark@myschool.test', 'benchmark', is_active=True)
+                client = APIClient()
+                client.force_authenticate(admin)
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = client.post('/school/bulk-enrollments/', items, format='json')
+                    elapsed = time.perf_counter() - start
+
+                if response.status_code != 201:
+                    self.stderr.write(f'{size} items: {response.status_code} {response.content[:300]}')
+                    continue
+                self.stdout.write(f'{size:>8} {len(queries):>8} {elapsed:>9.3f} {response.data["created"]:>8}')
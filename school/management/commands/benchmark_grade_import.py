@@ -0,0 +1,110 @@
+import csv
+import io
+import random
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+from school import models
+from school.gradesheets import GradeSheetReader
+from school.management.synthetic import scratch_database, seed_school
+
+
+def build_grades_file(student_numbers, header=('I', 2023, 'SYN0000', '1')):
+    # A regular workbook, like the ones teachers save from Excel, so the sheet has its <dimension> element.
+    workbook = Workbook()
+    sheet = workbook.active
+    for label, value in zip(['Semester', 'School Year', 'Course', 'Section'], header):
+        sheet.append([label, value])
+    sheet.append(['Student Number', 'Attendance', 'Assignment', 'Quiz', 'Midterm', 'Project', 'Final'])
+    for student_number in student_numbers:
+        sheet.append([student_number, random.randint(0, 10), random.randint(0, 5), random.randint(0, 10),
+                      random.randint(0, 25), random.randint(0, 15), random.randint(0, 35)])
+    content = io.BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def build_grades_csv(student_numbers, header=('I', 2023, 'SYN0000', '1')):
+    content = io.StringIO()
+    writer = csv.writer(content)
+    for label, value in zip(['Semester', 'School Year', 'Course', 'Section'], header):
+        writer.writerow([label, value])
+    writer.writerow(['Student Number', 'Attendance', 'Assignment', 'Quiz', 'Midterm', 'Project', 'Final'])
+    for student_number in student_numbers:
+        writer.writerow([student_number, random.randint(0, 10), random.randint(0, 5), random.randint(0, 10),
+                         random.randint(0, 25), random.randint(0, 15), random.randint(0, 35)])
+    return content.getvalue().encode()
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = 'Measures queries and wall time of the grade spreadsheet upload on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[50, 500, 5000])
+        parser.add_argument('--memory', action='store_true',
+                            help='Compare the peak memory of parsing the sheet instead of timing the upload.')
+
+    def handle(self, *args, **options):
+        if options['memory']:
+            return self.measure_memory(options['sizes'])
+
+        self.stdout.write(f'{"rows":>8} {"queries":>8} {"seconds":>9}')
+        for size in options['sizes']:
+            with scratch_database():
+                school = seed_school(students=size)
+                teach = school['teaches'][0]
+                student_numbers = [student.student_number for student in school['students']]
+                upload = SimpleUploadedFile('grades.xlsx', build_grades_file(student_numbers))
+                url = f'/school/teachers/{teach.teacher_id}/teaches/{teach.id}/grades/'
+
+                # Run the import inline so the whole parse-validate-insert cycle is measured.
+                with override_settings(GRADE_IMPORT_WORKERS=0), CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = APIClient().post(url, {'excel_file': upload}, format='multipart')
+                    elapsed = time.perf_counter() - start
+
+                job = models.GradeImportJob.objects.get(id=response.data['id'])
+                if job.status != models.GradeImportJob.SUCCEEDED:
+                    self.stderr.write(f'{size} rows: upload failed {job.errors}')
+                    continue
+                assert models.Grade.objects.count() == size
+                self.stdout.write(f'{size:>8} {len(queries):>8} {elapsed:>9.3f}')
+
+    def measure_memory(self, sizes):
+        excluded_indexes = [0, 1, 2, 3, 4]
+
+        def stream(path):
+            with open(path, 'rb') as f:
+                for _ in GradeSheetReader(f, excluded_indexes).chunks():
+                    pass
+
+        self.stdout.write(f'{"rows":>8} {"xlsx stream KiB":>16} {"csv stream KiB":>15} {"read_excel KiB":>15}')
+        for size in sizes:
+            student_numbers = [f'{i:06}' for i in range(size)]
+            with tempfile.NamedTemporaryFile(suffix='.xlsx') as xlsx_file, \
+                    tempfile.NamedTemporaryFile(suffix='.csv') as csv_file:
+                xlsx_file.write(build_grades_file(student_numbers))
+                xlsx_file.flush()
+                csv_file.write(build_grades_csv(student_numbers))
+                csv_file.flush()
+
+                xlsx_peak = peak_memory(lambda: stream(xlsx_file.name))
+                csv_peak = peak_memory(lambda: stream(csv_file.name))
+                whole_file = peak_memory(lambda: pd.read_excel(xlsx_file.name, header=None))
+            self.stdout.write(f'{size:>8} {xlsx_peak // 1024:>16} {csv_peak // 1024:>15} {whole_file // 1024:>15}')
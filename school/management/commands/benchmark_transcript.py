@@ -0,0 +1,81 @@
+import datetime
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.models import User
+from school import models
+from school.management.synthetic import scratch_database, seed_school
+
+
+def create_semesters(count, first_year=2015):
+    """
+    Past semesters, two per school year, created without Semester.save so the seeded one stays current.
+    """
+    semesters = []
+    for i in range(count):
+        school_year, _ = models.SchoolYear.objects.get_or_create(year=first_year + i // 2)
+        semesters.append(models.Semester(
+            name=['I', 'II'][i % 2], school_year=school_year,
+            enrollment_start_date=datetime.date(2000, 1, 1), enrollment_end_date=datetime.date(2000, 1, 1),
+            start_date=datetime.date(2000, 1, 1), end_date=datetime.date(2000, 1, 1)))
+    return models.Semester.objects.bulk_create(semesters)
+
+
+def create_grades(student, sections, semesters):
+    grades = []
+    for i, section in enumerate(sections):
+        semester = semesters[i * len(semesters) // len(sections)]
+        grade = models.Grade(
+            student=student, course_id=section.course_id, section=section, semester=semester,
+            school_year_id=semester.school_year_id, attendance=random.randint(1, 10),
+            assignment=random.randint(1, 5), quiz=random.randint(1, 10), midterm=random.randint(1, 25),
+            project=random.randint(1, 15), final=random.randint(1, 35))
+        grade.refresh_scores(3)
+        grades.append(grade)
+    models.Grade.objects.bulk_create(grades)
+
+
+def client_side_gpa(rows):
+    # What the frontend does with the raw grades: sum grade points and credits itself.
+    credits = sum(3 for row in rows if row['letter'] not in ('NG', 'I'))
+    points = sum(row['grade_point'] for row in rows if row['letter'] not in ('NG', 'I'))
+    return round(points / credits, 2) if credits else 0
+
+
+class Command(BaseCommand):
+    help = 'Compares the raw grades listing with the aggregated transcript of one student on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=40)
+        parser.add_argument('--semesters', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            school = seed_school(students=1, courses=options['courses'])
+            student = school['students'][0]
+            create_grades(student, school['sections'], create_semesters(options['semesters']))
+            admin = User.objects.create_superuser('benchmark', 'benchmark@myschool.test', 'benchmark', is_active=True)
+            client = APIClient()
+            client.force_authenticate(admin)
+
+            self.stdout.write(f'{"endpoint":>12} {"queries":>8} {"ms/request":>11} {"gpa":>6}')
+            for name, path in [('grades', 'grades'), ('transcript', 'transcript')]:
+                url = f'/school/students/{student.user_id}/{path}/'
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                query_count = len(queries)
+
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    response = client.get(url)
+                elapsed = (time.perf_counter() - start) / options['repeat'] * 1000
+
+                if response.status_code != 200:
+                    self.stderr.write(f'{name}: {response.status_code} {response.content[:200]}')
+                    continue
+                gpa = client_side_gpa(response.data) if name == 'grades' else response.data['cumulative_gpa']
+                self.stdout.write(f'{name:>12} {query_count:>8} {elapsed:>11.2f} {gpa:>6}')
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from school import models, registration
+from school.management.synthetic import scratch_database, seed_school
+
+
+class Command(BaseCommand):
+    help = ('Lets many threads enroll into and cancel from one section at the same time on a scratch '
+            'database and checks that the seat counter never oversells or drifts from the enrollments, '
+            'and that freed seats go to the waitlist in order.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--capacity', type=int, default=25)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory, \
+                scratch_database(os.path.join(directory, 'contention.sqlite3')):
+            school = seed_school(students=options['students'], courses=2)
+            section, semester = school['sections'][1], school['semester']
+            section.capacity = options['capacity']
+            section.save()
+            students = school['students']
+
+            def enroll(student):
+                try:
+                    with transaction.atomic():
+                        return models.Enrollment.objects.create(
+                            student=student, course_id=section.course_id, section=section,
+                            semester=semester, school_year=school['school_year'],
+                            **registration.seat_or_waitlist(section.id, semester.id))
+                finally:
+                    connection.close()
+
+            def cancel(enrollment):
+                try:
+                    with transaction.atomic():
+                        models.Enrollment.objects.filter(id=enrollment.id).update(
+                            status=models.Enrollment.CANCELLED)
+                        registration.free_seats(section.id, semester.id)
+                finally:
+                    connection.close()
+
+            def run_together(function, arguments):
+                # Every task waits for the start signal so the requests really overlap.
+                start = threading.Event()
+
+                def task(argument):
+                    start.wait()
+                    return function(argument)
+
+                with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                    futures = [executor.submit(task, argument) for argument in arguments]
+                    start.set()
+                    return [future.result() for future in futures]
+
+            enrollments = run_together(enroll, students)
+            self.verify_seats(section, semester, 'enroll rush')
+            waitlisted = sorted((e for e in enrollments if e.status == models.Enrollment.WAITLISTED),
+                                key=lambda enrollment: enrollment.waitlist_position)
+
+            # Half of the class drops at once, their seats must go to the head of the waitlist.
+            dropped = [e for e in enrollments if e.status != models.Enrollment.WAITLISTED][::2]
+            run_together(cancel, dropped)
+            self.verify_seats(section, semester, 'drops', promoted=waitlisted[:len(dropped)])
+
+            section.capacity += len(dropped)
+            section.save()
+            self.verify_seats(section, semester, 'capacity raise', promoted=waitlisted[:2 * len(dropped)])
+
+    def verify_seats(self, section, semester, phase, promoted=()):
+        seat = models.SectionSeat.objects.get(section=section, semester=semester)
+        enrollments = models.Enrollment.objects.filter(section=section, semester=semester)
+        holders = enrollments.filter(status__in=registration.SEAT_HOLDING_STATUSES).count()
+        positions = list(enrollments.filter(status=models.Enrollment.WAITLISTED)
+                         .values_list('waitlist_position', flat=True))
+        self.stdout.write(f'{phase}: capacity {seat.capacity}, reserved {seat.reserved}, '
+                          f'seat holders {holders}, waitlisted {len(positions)}')
+        if seat.reserved != holders or holders > seat.capacity:
+            raise CommandError(f'Seat counter is inconsistent after {phase}')
+        if len(set(positions)) != len(positions) or (positions and holders < seat.capacity):
+            raise CommandError(f'Waitlist is inconsistent after {phase}')
+        # Promotions must follow the waitlist order.
+        skipped = enrollments.filter(id__in=[e.id for e in promoted], status=models.Enrollment.WAITLISTED)
+        if skipped.exists():
+            raise CommandError(f'Waitlist was not promoted in order after {phase}')
@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.models import User
+from school.management.synthetic import scratch_database, seed_school
+
+ENDPOINTS = ['enroll', 'eligible', 'roster']
+PERCENTILES = [50, 95, 99]
+
+
+def parse_mix(value):
+    """
+    "enroll=3,eligible=5,roster=2" -> {'enroll': 3, 'eligible': 5, 'roster': 2}
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS or not weight.isdigit():
+            raise CommandError(f'Invalid mix entry "{part}", expected one of {ENDPOINTS} as name=weight')
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise CommandError('The mix needs at least one positive weight')
+    return mix
+
+
+def summarize(samples, seconds):
+    latencies = np.array([sample['ms'] for sample in samples], dtype=float)
+    queries = np.array([sample['queries'] for sample in samples], dtype=float)
+    lock_waits = [wait for sample in samples for wait in sample['lock_waits']]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+    return {
+        'requests': len(samples),
+        'throughput': round(len(samples) / seconds, 2) if seconds else None,
+        'statuses': statuses,
+        'latency_ms': {
+            **{f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))},
+            'mean': round(float(latencies.mean()), 2), 'max': round(float(latencies.max()), 2),
+        },
+        'queries': {'mean': round(float(queries.mean()), 2), 'max': int(queries.max())},
+        'lock_waits': {'count': len(lock_waits), 'total_ms': round(sum(lock_waits), 2)},
+    }
+
+
+class Command(BaseCommand):
+    help = ('Simulates the registration rush on a scratch database: many threads drive the enrollment, '
+            'eligible courses and section roster endpoints through the test client with a weighted mix, '
+            'and the latency percentiles, throughput, queries per request and lock waits are printed as JSON. '
+            'Lock waits are writes that took longer than --lock-threshold milliseconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--courses', type=int, default=20)
+        parser.add_argument('--sections-per-course', type=int, default=2)
+        parser.add_argument('--capacity', type=int, default=40)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--mix', type=parse_mix, default='enroll=3,eligible=5,roster=2')
+        parser.add_argument('--lock-threshold', type=float, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Writes the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory, \
+                scratch_database(os.path.join(directory, 'load.sqlite3')):
+            school = seed_school(students=options['students'], courses=options['courses'],
+                                 sections_per_course=options['sections_per_course'])
+            for section in school['sections']:
+                section.capacity = options['capacity']
+                section.save()
+            admin = User.objects.create_superuser('loadtest', 'loadtest@myschool.test', 'loadtest', is_active=True)
+
+            plan = self.plan(school, options)
+            samples = {name: [] for name in ENDPOINTS}
+            start_signal = threading.Event()
+
+            def worker(requests):
+                client = APIClient()
+                client.force_authenticate(admin)
+                start_signal.wait()
+                try:
+                    for name, method, url, data in requests:
+                        samples[name].append(self.request(client, method, url, data, options['lock_threshold']))
+                finally:
+                    connection.close()
+
+            chunks = [plan[i::options['threads']] for i in range(options['threads'])]
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                futures = [executor.submit(worker, chunk) for chunk in chunks]
+                start = time.perf_counter()
+                start_signal.set()
+                for future in futures:
+                    future.result()
+                seconds = time.perf_counter() - start
+
+        report = {
+            'config': {name: options[name] for name in [
+                'students', 'courses', 'sections_per_course', 'capacity', 'requests', 'threads', 'mix',
+                'lock_threshold', 'seed']},
+            'database': connection.vendor,
+            'seconds': round(seconds, 3),
+            'total': summarize([sample for rows in samples.values() for sample in rows], seconds),
+            'endpoints': {name: summarize(rows, seconds) for name, rows in samples.items() if rows},
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def plan(self, school, options):
+        """
+        The (endpoint, method, url, data) of every request, drawn up front so the runs are reproducible.
+        """
+        rng = random.Random(options['seed'])
+        names = list(options['mix'])
+        weights = [options['mix'][name] for name in names]
+        sections = school['sections']
+        plan = []
+        for name in rng.choices(names, weights, k=options['requests']):
+            student_id = rng.choice(school['students']).user_id
+            section = rng.choice(sections)
+            if name == 'enroll':
+                plan.append((name, 'post', f'/school/students/{student_id}/enrollments/', {
+                    'student': student_id, 'course': section.course_id, 'section': section.id,
+                    'semester': school['semester'].id, 'school_year': school['school_year'].id}))
+            elif name == 'eligible':
+                plan.append((name, 'get', f'/school/students/{student_id}/eligible-courses/', None))
+            else:
+                plan.append((name, 'get', f'/school/sections/{section.id}/current-semester-section-enrollments/',
+                             None))
+        return plan
+
+    def request(self, client, method, url, data, lock_threshold):
+        lock_waits = []
+
+        def time_writes(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                if elapsed >= lock_threshold and not sql.lstrip().upper().startswith('SELECT'):
+                    lock_waits.append(elapsed)
+
+        with connection.execute_wrapper(time_writes), CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            elapsed = (time.perf_counter() - start) * 1000
+        return {'status': response.status_code, 'ms': elapsed, 'queries': len(queries), 'lock_waits': lock_waits}
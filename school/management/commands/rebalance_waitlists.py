@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from school import models, registration, semesters
+
+
+class Command(BaseCommand):
+    help = 'Promotes waitlisted enrollments of the current semester into free seats.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true',
+                            help='Resets the seat counters to the seat-holding enrollments first.')
+
+    def handle(self, *args, **options):
+        seats = models.SectionSeat.objects.filter(semester_id=semesters.current_semester_id())
+        if options['recount']:
+            with transaction.atomic():
+                counts = seats.select_for_update().annotate(holders=Count('section__enrollments', filter=Q(
+                    section__enrollments__semester_id=F('semester_id'),
+                    section__enrollments__status__in=registration.SEAT_HOLDING_STATUSES)))
+                for seat in counts:
+                    if seat.reserved != seat.holders:
+                        self.stdout.write(f'Section {seat.section_id}: reserved {seat.reserved} -> {seat.holders}')
+                        models.SectionSeat.objects.filter(id=seat.id).update(reserved=seat.holders)
+
+        promoted = 0
+        for section_id, semester_id in seats.values_list('section_id', 'semester_id'):
+            promoted += registration.rebalance_waitlist(section_id, semester_id)
+        self.stdout.write(f'Promoted {promoted} waitlisted enrollments')
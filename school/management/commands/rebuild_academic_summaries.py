@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from school import summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the student academic summaries from the grades and checks them against the grades.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare the stored summaries with the grades.')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            summaries.rebuild_summaries()
+            self.stdout.write('Summaries rebuilt.')
+
+        differences = summaries.verify_summaries()
+        for model_name, key, stored, expected in differences[:50]:
+            self.stderr.write(f'{model_name} {key}: stored {stored}, expected {expected}')
+        if differences:
+            raise CommandError(f'{len(differences)} summaries do not match the grades.')
+        self.stdout.write('Summaries match the grades.')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from school import jobs
+
+
+class Command(BaseCommand):
+    help = ('Runs the grade import jobs still waiting in the queue, e.g. after a restart. Jobs left '
+            'running for longer than --timeout seconds (GRADE_IMPORT_TIMEOUT by default) are requeued first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int)
+
+    def handle(self, *args, **options):
+        requeued, ran = jobs.run_pending_grade_imports(options['timeout'])
+        self.stdout.write(f'{requeued} stale jobs requeued, {ran} jobs run')
@@ -0,0 +1,110 @@
+"""
+Helpers for the benchmark commands: a throwaway database and a synthetic school to fill it.
+"""
+import datetime
+import tempfile
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from core.models import User
+from school import models
+
+
+@contextmanager
+def scratch_database(path=None):
+    """
+    Runs the block against a freshly migrated test database and media directory which are
+    destroyed afterwards, so benchmarks never touch the real data. On SQLite, pass a file
+    path for a database that several threads can write to while waiting on each other's locks.
+    """
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    old_options = dict(connection.settings_dict['OPTIONS'])
+    if path:
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.settings_dict['OPTIONS']['timeout'] = 60
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+        connection.settings_dict['OPTIONS'] = old_options
+        teardown_test_environment()
+
+
+def create_users(prefix, count):
+    users = [User(username=f'{prefix}{i}', email=f'{prefix}{i}@myschool.test',
+                  first_name=prefix, last_name=str(i), is_active=True) for i in range(count)]
+    User.objects.bulk_create(users)
+    return list(User.objects.filter(username__startswith=prefix).order_by('id'))
+
+
+def seed_school(students=50, courses=1, sections_per_course=1):
+    """
+    Creates one current semester with its courses, sections, a teacher teaching every
+    section and `students` students enrolled (approved) in the first section.
+    """
+    school_year = models.SchoolYear.objects.create(year=2023)
+    department = models.Department.objects.create(name='Synthetic', budget=1000, duty='Benchmarks')
+    major = models.Major.objects.create(name='Synthetic', department=department)
+    building = models.Building.objects.create(
+        name='Synthetic', dimension='10x10', office_counts=1, toilet_counts=1,
+        classroom_counts=sections_per_course * courses, date_constructed=datetime.date(2000, 1, 1))
+    office = models.Office.objects.create(building=building, dimension='4x4')
+
+    course_objs = models.Course.objects.bulk_create([
+        models.Course(code=f'SYN{i:04}', title=f'Synthetic {i}', level=models.Course.FR,
+                      price_per_credit=10, credit=3) for i in range(courses)])
+    department.courses.set(course_objs)
+
+    semester = models.Semester(
+        name='I', school_year=school_year,
+        enrollment_start_date=datetime.date(2023, 1, 1), enrollment_end_date=datetime.date(2023, 1, 15),
+        start_date=datetime.date(2023, 1, 16), end_date=datetime.date(2023, 5, 30))
+    semester.save()
+    semester.courses.set(course_objs)
+
+    sections = []
+    for course in course_objs:
+        for i in range(sections_per_course):
+            number = len(sections)
+            classroom = models.ClassRoom.objects.create(
+                building=building, name=f'SYN-{number}', dimension='8x8')
+            classtime = models.ClassTime.objects.create(
+                start_time='8:00AM', end_time='9:00AM', week_days=str(number))
+            sections.append(models.Section.objects.create(
+                name=str(i + 1), course=course, classroom=classroom, classtime=classtime))
+
+    teacher_user = create_users('synteacher', 1)[0]
+    teacher = models.Teacher.objects.create(
+        user=teacher_user, birth_date=datetime.date(1980, 1, 1), gender=models.Teacher.MALE,
+        religion=models.Teacher.NONE, phone='0000', image='school/images/synthetic.jpg',
+        marital_status=models.Teacher.SINGLE, employment_status=models.Teacher.FULL_TIME,
+        level_of_education=models.Teacher.MSC, department=department, salary=100,
+        office=office, term_of_reference='school/TOR/synthetic.pdf')
+
+    teaches = models.Teach.objects.bulk_create([
+        models.Teach(teacher=teacher, course_id=section.course_id, section=section,
+                     school_year=school_year, semester=semester) for section in sections])
+
+    student_objs = models.Student.objects.bulk_create([
+        models.Student(
+            user=user, birth_date=datetime.date(2000, 1, 1), gender=models.Student.FEMALE,
+            religion=models.Student.NONE, phone='0000', image='school/images/synthetic.jpg',
+            level=models.Student.FR, department=department, supervisor=teacher, major=major,
+            student_number=f'{i + 1:06}', registration_fee=0)
+        for i, user in enumerate(create_users('synstudent', students))])
+
+    models.Enrollment.objects.bulk_create([
+        models.Enrollment(student=student, course_id=sections[0].course_id, section=sections[0],
+                          semester=semester, school_year=school_year, status=models.Enrollment.APPROVED)
+        for student in student_objs])
+
+    return {
+        'school_year': school_year, 'semester': semester, 'department': department,
+        'major': major, 'courses': course_objs, 'sections': sections, 'teacher': teacher,
+        'teaches': teaches, 'students': student_objs,
+    }
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:12
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0003_alter_enrollment_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grades_file', models.FileField(upload_to='school/grade_imports', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['xlsx', 'csv'])])),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Succeeded', 'Succeeded'), ('Failed', 'Failed')], default='Pending', max_length=9)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('teach', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='grade_import_jobs', to='school.teach')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0004_gradeimportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradeimportjob',
+            name='mode',
+            field=models.CharField(choices=[('create', 'create'), ('upsert', 'upsert')], default='create', max_length=6),
+        ),
+        migrations.AddField(
+            model_name='gradeimportjob',
+            name='report',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
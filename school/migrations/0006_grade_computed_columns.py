@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:16
+
+from django.db import migrations, models
+from school.utility import grade_total_score, grade_letter, grade_point
+
+
+def backfill_computed_columns(apps, schema_editor):
+    Grade = apps.get_model('school', 'Grade')
+    grades = []
+    for grade in Grade.objects.select_related('course').iterator(chunk_size=2000):
+        components = [grade.attendance, grade.assignment, grade.quiz, grade.midterm, grade.project, grade.final]
+        grade.total_score = grade_total_score(components)
+        grade.letter = grade_letter(components)
+        grade.grade_point = grade_point(grade.course.credit, grade.total_score)
+        grades.append(grade)
+        if len(grades) == 2000:
+            Grade.objects.bulk_update(grades, ['total_score', 'letter', 'grade_point'])
+            grades = []
+    Grade.objects.bulk_update(grades, ['total_score', 'letter', 'grade_point'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0005_gradeimportjob_mode_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='grade_point',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='letter',
+            field=models.CharField(db_index=True, default='NG', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='total_score',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_computed_columns, migrations.RunPython.noop),
+    ]
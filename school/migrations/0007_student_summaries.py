@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+from django.db.models import Case, Q, Sum, Value, When
+from school.utility import PASSING_SCORE, UNGRADED_LETTERS, grade_point_expression
+
+
+def gpa(quality_points, attempted_credits):
+    return Decimal(str(round(quality_points / attempted_credits, 2))) if attempted_credits else Decimal(0)
+
+
+def backfill_summaries(apps, schema_editor):
+    Grade = apps.get_model('school', 'Grade')
+    StudentSemesterSummary = apps.get_model('school', 'StudentSemesterSummary')
+    StudentAcademicSummary = apps.get_model('school', 'StudentAcademicSummary')
+    graded = ~Q(letter__in=UNGRADED_LETTERS)
+    totals = Grade.objects.values('student_id', 'school_year_id', 'semester_id').annotate(
+        attempted_credits=Sum('course__credit', filter=graded, default=0),
+        earned_credits=Sum(Case(When(total_score__gte=PASSING_SCORE, then='course__credit'), default=Value(0)),
+                           filter=graded, default=0),
+        quality_points=Sum(grade_point_expression('course__credit'), filter=graded, default=0),
+    ).order_by()
+
+    semesters, students = [], {}
+    for row in totals:
+        semesters.append(StudentSemesterSummary(gpa=gpa(row['quality_points'], row['attempted_credits']), **row))
+        student = students.setdefault(row['student_id'], StudentAcademicSummary(student_id=row['student_id']))
+        student.attempted_credits += row['attempted_credits']
+        student.earned_credits += row['earned_credits']
+        student.quality_points += row['quality_points']
+    for student in students.values():
+        student.gpa = gpa(student.quality_points, student.attempted_credits)
+    StudentSemesterSummary.objects.bulk_create(semesters, batch_size=500)
+    StudentAcademicSummary.objects.bulk_create(students.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0006_grade_computed_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAcademicSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='academic_summary', serialize=False, to='school.student')),
+                ('attempted_credits', models.PositiveIntegerField(default=0)),
+                ('earned_credits', models.PositiveIntegerField(default=0)),
+                ('quality_points', models.PositiveIntegerField(default=0)),
+                ('gpa', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=3)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentSemesterSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempted_credits', models.PositiveIntegerField(default=0)),
+                ('earned_credits', models.PositiveIntegerField(default=0)),
+                ('quality_points', models.PositiveIntegerField(default=0)),
+                ('gpa', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='school.schoolyear')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='school.semester')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='semester_summaries', to='school.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['semester', '-gpa'], name='school_stud_semeste_129202_idx')],
+                'unique_together': {('student', 'semester')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
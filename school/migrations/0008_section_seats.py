@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def create_current_seats(apps, schema_editor):
+    Enrollment = apps.get_model('school', 'Enrollment')
+    Section = apps.get_model('school', 'Section')
+    SectionSeat = apps.get_model('school', 'SectionSeat')
+    taken = Enrollment.objects.filter(semester__is_current=True).exclude(status='Cancelled')\
+        .values('section_id', 'semester_id').annotate(reserved=Count('id')).order_by()
+    capacities = dict(Section.objects.values_list('id', 'capacity'))
+    SectionSeat.objects.bulk_create([
+        SectionSeat(section_id=row['section_id'], semester_id=row['semester_id'],
+                    capacity=capacities[row['section_id']], reserved=row['reserved'])
+        for row in taken])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0007_student_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='section',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=40),
+        ),
+        migrations.CreateModel(
+            name='SectionSeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capacity', models.PositiveSmallIntegerField()),
+                ('reserved', models.PositiveIntegerField(default=0)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seats', to='school.section')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='section_seats', to='school.semester')),
+            ],
+            options={
+                'unique_together': {('section', 'semester')},
+            },
+        ),
+        migrations.RunPython(create_current_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:33
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+import django.utils.timezone
+
+
+def date_existing_marks(apps, schema_editor):
+    """
+    Dates the marks by the day they were taken. A mark repeating another one of the same
+    student, section and day word for word is dropped, nothing is lost with it. Marks that
+    disagree stop the migration with their ids, someone has to pick the right one by hand.
+    """
+    Attendance = apps.get_model('school', 'Attendance')
+    Attendance.objects.update(date=TruncDate('created_at'))
+    repeated = Attendance.objects.values('student_id', 'section_id', 'date')\
+        .annotate(marks=Count('id'), latest=Max('id')).filter(marks__gt=1).order_by()
+    conflicts = []
+    for row in repeated:
+        marks = Attendance.objects.filter(student_id=row['student_id'], section_id=row['section_id'], date=row['date'])
+        if marks.values('mark', 'comment').distinct().count() == 1:
+            marks.exclude(id=row['latest']).delete()
+        else:
+            listing = ', '.join(f'#{mark.id} {mark.mark}' + (f' "{mark.comment}"' if mark.comment else '')
+                                for mark in marks.order_by('id'))
+            conflicts.append(f'student {row["student_id"]}, section {row["section_id"]}, {row["date"]}: {listing}')
+    if conflicts:
+        raise RuntimeError(
+            'A student can only have one attendance mark per section and day, delete all but one '
+            'of the marks of each day below and migrate again:\n' + '\n'.join(conflicts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0009_enrollment_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.RunPython(date_existing_marks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('student', 'section', 'date'), name='one_attendance_mark_per_day'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0010_attendance_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionAttendanceDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('marks', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='attendance_days', to='school.section')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='school.semester')),
+            ],
+            options={
+                'unique_together': {('section', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceRosterEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='attendance_roster', to='school.section')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='school.semester')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='school.student')),
+            ],
+            options={
+                'unique_together': {('section', 'semester', 'position'), ('section', 'semester', 'student')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceDayComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment', models.TextField()),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='school.sectionattendanceday')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='school.student')),
+            ],
+            options={
+                'unique_together': {('day', 'student')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0011_compact_attendance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['section', 'date', 'id'], name='school_atte_section_37c1d1_idx'),
+        ),
+    ]
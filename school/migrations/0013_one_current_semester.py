@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+def keep_latest_current_semester(apps, schema_editor):
+    # Concurrent saves could leave several current semesters, the last one created wins.
+    Semester = apps.get_model('school', 'Semester')
+    latest = Semester.objects.filter(is_current=True).order_by('-id').values_list('id', flat=True).first()
+    Semester.objects.filter(is_current=True).exclude(id=latest).update(is_current=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0012_attendance_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_current_semester, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='semester',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('is_current',), name='one_current_semester'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0015_cache_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sectionattendanceday',
+            name='mark_ids',
+            field=models.TextField(default=''),
+        ),
+    ]
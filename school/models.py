@@ -1,9 +1,12 @@
 from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import FileExtensionValidator
-from .utility import image_upload_path, student_number_generator, tor_upload_path
+from .utility import image_upload_path, student_number_generator, tor_upload_path, \
+    grade_total_score, grade_letter, grade_point, grade_point_expression
 from .validators import validate_school_year, validate_file_size
+from .signals import grades_written
 
 
 class SchoolYear(models.Model):
@@ -101,6 +104,15 @@ class Course(Status):
     additional_fee = models.DecimalField(
         max_digits=5, decimal_places=2, default=0)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            credit_changed = not self._state.adding and Course.objects.filter(
+                pk=self.pk).exclude(credit=self.credit).exists()
+            super().save(*args, **kwargs)
+            if credit_changed:
+                self.grades.update(grade_point=grade_point_expression(models.Value(self.credit)))
+                grades_written.send(sender=Grade, grades=self.grades.all())
+
     def __str__(self) -> str:
         return self.code
 
@@ -127,17 +139,25 @@ class Semester(models.Model):
     #                                     FileExtensionValidator(allowed_extensions=['pdf'])])
 
     def save(self, *args, **kwargs):
+        """
+        A new semester becomes the current one: the previous current row is switched off
+        with a single-row UPDATE that holds its lock until the new row is in. Edits of an
+        existing semester never write is_current.
+        """
         with transaction.atomic():
             if self._state.adding:
                 self.is_current = True
-
-            previous_semesters = Semester.objects.filter(is_current=True)
-            previous_semesters.update(is_current=False)
-
+                Semester.objects.filter(is_current=True).update(is_current=False)
+            elif kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                           if not field.primary_key and field.name != 'is_current']
             return super().save(*args, **kwargs)
 
     class Meta:
         unique_together = [['name', 'school_year']]
+        # At most one current semester, which also makes the lookup of the current one a single index entry.
+        constraints = [models.UniqueConstraint(
+            fields=['is_current'], condition=models.Q(is_current=True), name='one_current_semester')]
 
     def __str__(self) -> str:
         return self.name
@@ -365,6 +385,7 @@ class Section(models.Model):
         ClassRoom, on_delete=models.PROTECT, related_name='sections')
     classtime = models.ForeignKey(
         ClassTime, on_delete=models.PROTECT, related_name='sections')
+    capacity = models.PositiveSmallIntegerField(default=40)
 
     class Meta:
         unique_together = [['classroom', 'classtime'], ['name', 'course']]
@@ -373,6 +394,24 @@ class Section(models.Model):
         return self.name
 
 
+class SectionSeat(models.Model):
+    """
+    Seats taken in a section during a semester. reserved is only ever changed with the
+    conditional UPDATEs of school.registration, so concurrent enrollments cannot oversell.
+    """
+    section = models.ForeignKey(
+        Section, on_delete=models.CASCADE, related_name='seats')
+    semester = models.ForeignKey(
+        Semester, on_delete=models.CASCADE, related_name='section_seats')
+    capacity = models.PositiveSmallIntegerField()
+    reserved = models.PositiveIntegerField(default=0)
+    # Position handed to the next student put on the waitlist
+    waitlist_tail = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['section', 'semester']]
+
+
 class Attendance(models.Model):
     P = 'P'
     A = 'A'
@@ -394,19 +433,73 @@ class Attendance(models.Model):
         Section, on_delete=models.PROTECT, related_name='attendances')
     mark = models.CharField(max_length=1, choices=MARK_CHOICES)
     comment = models.TextField(null=True, blank=True)
+    # The class meeting the mark is for, a student gets one mark per section per day.
+    date = models.DateField(default=timezone.localdate)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    # They should be date instead of datetime!!!
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['student', 'section', 'date'], name='one_attendance_mark_per_day')]
+        # Pages of a section's history are read in (date, id) order.
+        indexes = [models.Index(fields=['section', 'date', 'id'])]
+
+
+class AttendanceRosterEntry(models.Model):
+    """
+    Position of a student in the packed marks of their section's archived attendance days.
+    """
+    section = models.ForeignKey(
+        Section, on_delete=models.PROTECT, related_name='attendance_roster')
+    semester = models.ForeignKey(Semester, on_delete=models.PROTECT)
+    student = models.ForeignKey(Student, on_delete=models.PROTECT)
+    position = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = [['section', 'semester', 'position'], ['section', 'semester', 'student']]
+
+
+class SectionAttendanceDay(models.Model):
+    """
+    The archived attendance of a section on one day: one P/A/E/T character per roster
+    position, UNMARKED for the students who had no mark, and the ids the marks had as
+    Attendance rows, comma separated in the same positions. Replaces the Attendance rows
+    of closed semesters, see school.attendance.archive_semester.
+    """
+    UNMARKED = '-'
+    section = models.ForeignKey(
+        Section, on_delete=models.PROTECT, related_name='attendance_days')
+    semester = models.ForeignKey(Semester, on_delete=models.PROTECT)
+    date = models.DateField()
+    marks = models.TextField()
+    mark_ids = models.TextField(default='')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['section', 'date']]
+
+
+class AttendanceDayComment(models.Model):
+    # Only the few marks that had a comment get a row.
+    day = models.ForeignKey(
+        SectionAttendanceDay, on_delete=models.CASCADE, related_name='comments')
+    student = models.ForeignKey(Student, on_delete=models.PROTECT)
+    comment = models.TextField()
+
+    class Meta:
+        unique_together = [['day', 'student']]
 
 
 class Enrollment(models.Model):
     APPROVED = 'Approved'
     PENDING = 'Pending'
     CANCELLED = 'Cancelled'
+    WAITLISTED = 'Waitlisted'
     STATUS_CHOICES = (
         (PENDING, PENDING),
         (APPROVED, APPROVED),
-        (CANCELLED, CANCELLED)
+        (CANCELLED, CANCELLED),
+        (WAITLISTED, WAITLISTED)
     )
     student = models.ForeignKey(
         Student, on_delete=models.PROTECT, related_name='enrollments')
@@ -419,12 +512,15 @@ class Enrollment(models.Model):
     school_year = models.ForeignKey(
         SchoolYear, on_delete=models.PROTECT, related_name='enrollments')
     status = models.CharField(
-        max_length=9, choices=STATUS_CHOICES, default=PENDING)
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
     has_scholarship = models.BooleanField(default=False)#Remove this field, it bolong to semester registration...but its implementation is not clear yet.
+    # Place in the section's waitlist, only set while the status is Waitlisted
+    waitlist_position = models.PositiveIntegerField(null=True, blank=True)
     date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = [['student', 'course', 'section', 'semester', 'school_year']]
+        indexes = [models.Index(fields=['section', 'semester', 'status', 'waitlist_position'])]
 
 
 class Teach(models.Model):
@@ -471,12 +567,111 @@ class Grade(models.Model):
                                   MinValueValidator(0), MaxValueValidator(15)])
     final = models.DecimalField(max_digits=4, decimal_places=2, validators=[
                                 MinValueValidator(0), MaxValueValidator(35)])
+    # Derived from the components above, kept in sync by refresh_scores()
+    total_score = models.PositiveSmallIntegerField(default=0, db_index=True)
+    letter = models.CharField(max_length=2, default='NG', db_index=True)
+    grade_point = models.PositiveSmallIntegerField(default=0)
     graded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    COMPUTED_FIELDS = ['total_score', 'letter', 'grade_point']
+
+    def refresh_scores(self, credit):
+        components = [self.attendance, self.assignment, self.quiz, self.midterm, self.project, self.final]
+        self.total_score = grade_total_score(components)
+        self.letter = grade_letter(components)
+        self.grade_point = grade_point(credit, self.total_score)
+
+    def save(self, *args, **kwargs):
+        self.refresh_scores(self.course.credit)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *self.COMPUTED_FIELDS}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            grades_written.send(sender=Grade, grades=Grade.objects.filter(pk=self.pk))
+
     class Meta:
         unique_together = [['student', 'school_year', 'semester', 'course', 'section']]
 
+
+class StudentSemesterSummary(models.Model):
+    """
+    Credits and GPA of a student in one semester, kept up to date by school.summaries
+    whenever grades are written.
+    """
+    student = models.ForeignKey(
+        Student, on_delete=models.CASCADE, related_name='semester_summaries')
+    school_year = models.ForeignKey(
+        SchoolYear, on_delete=models.CASCADE, related_name='student_summaries')
+    semester = models.ForeignKey(
+        Semester, on_delete=models.CASCADE, related_name='student_summaries')
+    attempted_credits = models.PositiveIntegerField(default=0)
+    earned_credits = models.PositiveIntegerField(default=0)
+    quality_points = models.PositiveIntegerField(default=0)
+    gpa = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['student', 'semester']]
+        indexes = [models.Index(fields=['semester', '-gpa'])]
+
+
+class StudentAcademicSummary(models.Model):
+    """
+    Cumulative credits and GPA of a student over every semester.
+    """
+    student = models.OneToOneField(
+        Student, on_delete=models.CASCADE, primary_key=True, related_name='academic_summary')
+    attempted_credits = models.PositiveIntegerField(default=0)
+    earned_credits = models.PositiveIntegerField(default=0)
+    quality_points = models.PositiveIntegerField(default=0)
+    gpa = models.DecimalField(max_digits=3, decimal_places=2, default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class GradeImportJob(models.Model):
+    """
+    A grade spreadsheet upload waiting for, or processed by, the background workers.
+    """
+    PENDING = 'Pending'
+    RUNNING = 'Running'
+    SUCCEEDED = 'Succeeded'
+    FAILED = 'Failed'
+    STATUS_CHOICES = (
+        (PENDING, PENDING),
+        (RUNNING, RUNNING),
+        (SUCCEEDED, SUCCEEDED),
+        (FAILED, FAILED)
+    )
+    CREATE = 'create'
+    UPSERT = 'upsert'
+    MODE_CHOICES = (
+        (CREATE, CREATE),
+        (UPSERT, UPSERT)
+    )
+    teach = models.ForeignKey(
+        Teach, on_delete=models.PROTECT, related_name='grade_import_jobs')
+    grades_file = models.FileField(upload_to='school/grade_imports', validators=[
+                                   FileExtensionValidator(allowed_extensions=['xlsx', 'csv'])])
+    mode = models.CharField(max_length=6, choices=MODE_CHOICES, default=CREATE)
+    status = models.CharField(
+        max_length=9, choices=STATUS_CHOICES, default=PENDING)
+    rows_processed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(null=True, blank=True)
+    report = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class CacheCounter(models.Model):
+    """
+    A cache hit or miss count. Incremented with F() so every worker adds to the same total,
+    and kept in the database where it never expires.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    count = models.PositiveBigIntegerField(default=0)
+
 # class SemesterEnrollment(models.Model):
 #     """
 #     This class was not used in this project because of limited time.
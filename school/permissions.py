@@ -43,4 +43,12 @@ class DeleteModelPermission(permissions.DjangoModelPermissions):
 class FullDjangoModelPermissions(permissions.DjangoModelPermissions):
     def __init__(self) -> None:
         self.perms_map['GET']: ['%(app_label)s.view_%(model_name)s']
-        
\ No newline at end of file
+        
+
+class BulkUpdateModelPermission(permissions.DjangoModelPermissions):
+    def __init__(self) -> None:
+        self.perms_map = {
+            'OPTIONS': [],
+            'HEAD': [],
+            'POST': ['%(app_label)s.change_%(model_name)s']
+        }
@@ -0,0 +1,206 @@
+"""
+The Course.prerequisite graph, loaded in one query and kept in process until a course changes.
+Its version stamp lives in the default cache, which must be shared by every worker, the
+passed-course sets in the passed_courses cache (see CACHES in the settings).
+"""
+import logging
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import models, semesters
+from .signals import grades_written
+from .utility import bump_version_stamp, get_version_stamp
+
+logger = logging.getLogger(__name__)
+
+# Score a student needs in a course for it to count as a passed prerequisite.
+PREREQUISITE_PASSING_SCORE = 70
+GRAPH_VERSION_CACHE_KEY = 'prerequisite-graph:version'
+PASSED_COURSES_CACHE_TIMEOUT = 60 * 60 * 24
+PASSED_COURSES_COUNTERS = {'hits': 'passed-courses:hits', 'misses': 'passed-courses:misses'}
+
+
+class PrerequisiteGraph:
+    """
+    Maps every course id to the ids of all the courses it transitively requires.
+    Courses on a prerequisite cycle can never be taken and are listed in cycles.
+    """
+
+    def __init__(self, prerequisite_of):
+        self.prerequisite_of = prerequisite_of
+        self.requirements = {}
+        self.cycles = set()
+        for course_id in prerequisite_of:
+            self.resolve(course_id)
+
+    def resolve(self, course_id):
+        # Walks up the prerequisite chain until a course that is already resolved.
+        path, on_path = [], set()
+        while course_id is not None and course_id not in self.requirements:
+            if course_id in on_path:
+                cycle = path[path.index(course_id):]
+                self.cycles.update(cycle)
+                for member in cycle:
+                    self.requirements[member] = frozenset(cycle)
+                break
+            path.append(course_id)
+            on_path.add(course_id)
+            course_id = self.prerequisite_of.get(course_id)
+
+        for member in reversed(path):
+            if member in self.requirements:
+                continue
+            prerequisite = self.prerequisite_of.get(member)
+            if prerequisite is None:
+                self.requirements[member] = frozenset()
+            else:
+                self.requirements[member] = self.requirements[prerequisite] | {prerequisite}
+                if prerequisite in self.cycles:
+                    self.cycles.add(member)
+
+    def eligible_courses(self, offered_ids, passed_ids):
+        """
+        The offered courses not passed yet whose prerequisites have all been passed.
+        """
+        return {
+            course_id for course_id in offered_ids - passed_ids
+            if course_id not in self.cycles and self.requirements.get(course_id, frozenset()) <= passed_ids
+        }
+
+
+def load_graph():
+    graph = PrerequisiteGraph(dict(models.Course.objects.values_list('id', 'prerequisite_id')))
+    if graph.cycles:
+        logger.warning('Courses %s are on a prerequisite cycle and can never be taken', sorted(graph.cycles))
+    return graph
+
+
+_graph = None
+_graph_version = None
+
+
+def get_graph():
+    """
+    The graph is rebuilt whenever the version stamp in the cache changes, so a course
+    saved in one process invalidates the graph of every process.
+    """
+    global _graph, _graph_version
+    version = get_version_stamp(GRAPH_VERSION_CACHE_KEY)
+    if _graph is None or version != _graph_version:
+        _graph, _graph_version = load_graph(), version
+    return _graph
+
+
+@receiver(post_save, sender=models.Course, dispatch_uid='invalidate_prerequisite_graph_on_save')
+@receiver(post_delete, sender=models.Course, dispatch_uid='invalidate_prerequisite_graph_on_delete')
+def invalidate_graph(sender, **kwargs):
+    bump_version_stamp(GRAPH_VERSION_CACHE_KEY)
+
+
+PER_PROCESS_CACHE_BACKENDS = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    warnings = []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PER_PROCESS_CACHE_BACKENDS:
+        warnings.append(checks.Warning(
+            f'The default cache {backend} is not shared between processes, the other workers keep '
+            'stale prerequisite graphs and current semesters.',
+            hint='Configure a shared cache such as RedisCache or DatabaseCache in CACHES.',
+            id='school.W001'))
+    backend = settings.CACHES.get('passed_courses', {}).get('BACKEND')
+    if backend == PER_PROCESS_CACHE_BACKENDS[0]:
+        warnings.append(checks.Warning(
+            f'The passed_courses cache {backend} is not shared between processes, the other workers '
+            'keep stale passed courses.',
+            hint='Use RedisCache for the passed_courses cache, or DummyCache to turn it off.',
+            id='school.W002'))
+    return warnings
+
+
+def passed_courses_cache_key(student_id):
+    return f'passed-courses:{student_id}'
+
+
+def count_passed_courses_lookup(outcome):
+    counter = models.CacheCounter.objects.filter(name=PASSED_COURSES_COUNTERS[outcome])
+    if not counter.update(count=F('count') + 1):
+        models.CacheCounter.objects.get_or_create(name=PASSED_COURSES_COUNTERS[outcome])
+        counter.update(count=F('count') + 1)
+
+
+def get_passed_courses_stats():
+    counts = dict(models.CacheCounter.objects.filter(
+        name__in=PASSED_COURSES_COUNTERS.values()).values_list('name', 'count'))
+    hits, misses = (counts.get(name, 0) for name in PASSED_COURSES_COUNTERS.values())
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+
+
+def get_passed_course_ids(student_id):
+    """
+    The ids of the courses the student passed, cached until one of their grades is written.
+    """
+    key = passed_courses_cache_key(student_id)
+    passed = caches['passed_courses'].get(key)
+    if passed is not None:
+        count_passed_courses_lookup('hits')
+        return passed
+
+    count_passed_courses_lookup('misses')
+    passed = set(models.Grade.objects.filter(
+        student_id=student_id, total_score__gte=PREREQUISITE_PASSING_SCORE).values_list('course_id', flat=True))
+    caches['passed_courses'].set(key, passed, timeout=PASSED_COURSES_CACHE_TIMEOUT)
+    return passed
+
+
+@receiver(grades_written, dispatch_uid='invalidate_passed_courses')
+def invalidate_passed_courses(sender, grades, **kwargs):
+    keys = [passed_courses_cache_key(student_id)
+            for student_id in grades.values_list('student_id', flat=True).distinct()]
+    transaction.on_commit(lambda: caches['passed_courses'].delete_many(keys))
+
+
+def group_course_ids(rows):
+    grouped = {}
+    for owner_id, course_id in rows:
+        grouped.setdefault(owner_id, set()).add(course_id)
+    return grouped
+
+
+def load_eligibility_inputs(students):
+    """
+    Everything eligibility needs for a Student queryset in three queries: the students, the
+    current offerings per department and the passed courses per student.
+    Returns (offered, rows) where rows holds (student_id, department_id, passed).
+    """
+    student_rows = list(students.values_list('user_id', 'department_id'))
+    student_ids = students.values('user_id')
+    offered = group_course_ids(models.Course.departments.through.objects.filter(
+        course__semesters=semesters.current_semester_id()).values_list('department_id', 'course_id'))
+    passed = group_course_ids(models.Grade.objects.filter(
+        student_id__in=student_ids, total_score__gte=PREREQUISITE_PASSING_SCORE,
+    ).values_list('student_id', 'course_id'))
+    return offered, [
+        (student_id, department_id, passed.get(student_id, set()))
+        for student_id, department_id in student_rows
+    ]
+
+
+def eligible_courses_of_students(graph, offered, rows):
+    """
+    {student_id: sorted eligible course ids} of load_eligibility_inputs rows. Does not touch
+    the database, so chunks of rows can be handed to worker processes.
+    """
+    return {
+        student_id: sorted(graph.eligible_courses(offered.get(department_id, set()), passed))
+        for student_id, department_id, passed in rows
+    }
@@ -0,0 +1,324 @@
+"""
+Enrollment of students into sections: seat counting, waitlists and set-based bulk enrollment.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from . import models, semesters
+
+
+class BulkEnrollmentError(Exception):
+    pass
+
+
+class SectionFullError(Exception):
+    pass
+
+
+# Statuses that take a seat in the section; waitlisted and cancelled enrollments do not.
+SEAT_HOLDING_STATUSES = [models.Enrollment.PENDING, models.Enrollment.APPROVED]
+
+
+def holds_seat(status):
+    return status in SEAT_HOLDING_STATUSES
+
+
+def get_seat(section_id, semester_id):
+    """
+    The seat counter of a section in a semester, created on first use from the enrollments already there.
+    """
+    seat = models.SectionSeat.objects.filter(section_id=section_id, semester_id=semester_id).first()
+    if seat:
+        return seat
+    section = models.Section.objects.annotate(taken=Count('enrollments', filter=Q(
+        enrollments__semester_id=semester_id, enrollments__status__in=SEAT_HOLDING_STATUSES))).get(id=section_id)
+    try:
+        with transaction.atomic():
+            return models.SectionSeat.objects.create(
+                section_id=section_id, semester_id=semester_id, capacity=section.capacity, reserved=section.taken)
+    except IntegrityError:
+        return models.SectionSeat.objects.get(section_id=section_id, semester_id=semester_id)
+
+
+def reserve_seats(section_id, semester_id, count=1):
+    """
+    Takes count seats in one conditional UPDATE, which only succeeds if they are all still free.
+    """
+    seats = models.SectionSeat.objects.filter(section_id=section_id, semester_id=semester_id)
+    for _ in range(2):
+        if seats.filter(reserved__lte=F('capacity') - count).update(reserved=F('reserved') + count):
+            return
+        if seats.exists():
+            break
+        get_seat(section_id, semester_id)
+    raise SectionFullError('Section is full')
+
+
+def reserve_available_seats(section_id, semester_id, wanted):
+    """
+    Takes up to wanted seats and returns how many were taken.
+    """
+    seat = get_seat(section_id, semester_id)
+    while True:
+        seat.refresh_from_db(fields=['capacity', 'reserved'])
+        count = min(wanted, seat.capacity - seat.reserved)
+        if count <= 0:
+            return 0
+        # Another request may take seats between the read and the update, in which case read again.
+        if models.SectionSeat.objects.filter(id=seat.id, reserved=seat.reserved)\
+                .update(reserved=F('reserved') + count):
+            return count
+
+
+def release_seats(section_id, semester_id, count=1):
+    models.SectionSeat.objects.filter(section_id=section_id, semester_id=semester_id, reserved__gte=count)\
+        .update(reserved=F('reserved') - count)
+
+
+def join_waitlist(section_id, semester_id, count=1):
+    """
+    Hands out count consecutive waitlist positions and returns the first one. The UPDATE
+    locks the counter row until the transaction ends, so the read back is ours alone.
+    """
+    seats = models.SectionSeat.objects.filter(section_id=section_id, semester_id=semester_id)
+    if not seats.update(waitlist_tail=F('waitlist_tail') + count):
+        get_seat(section_id, semester_id)
+        seats.update(waitlist_tail=F('waitlist_tail') + count)
+    return seats.values_list('waitlist_tail', flat=True).get() - count
+
+
+def seat_or_waitlist(section_id, semester_id):
+    """
+    Takes a seat for a new enrollment, or puts it at the end of the waitlist when the
+    section is full. Returns the fields to save the enrollment with.
+    """
+    try:
+        reserve_seats(section_id, semester_id)
+        return {}
+    except SectionFullError:
+        return {'status': models.Enrollment.WAITLISTED,
+                'waitlist_position': join_waitlist(section_id, semester_id)}
+
+
+def promote_waitlisted(section_id, semester_id, count=1):
+    """
+    Gives count seats the caller already holds to the head of the waitlist and returns how
+    many were handed over. Each promotion is a lookup of the lowest position on the
+    waitlist index followed by a conditional UPDATE, so two cancellations can never
+    promote the same enrollment.
+    """
+    waitlist = models.Enrollment.objects.filter(
+        section_id=section_id, semester_id=semester_id, status=models.Enrollment.WAITLISTED)
+    promoted = 0
+    while promoted < count:
+        heads = list(waitlist.order_by('waitlist_position').select_for_update(skip_locked=True)
+                     .values_list('id', flat=True)[:count - promoted])
+        if not heads:
+            break
+        promoted += waitlist.filter(id__in=heads).update(status=models.Enrollment.PENDING, waitlist_position=None)
+    return promoted
+
+
+def free_seats(section_id, semester_id, count=1):
+    """
+    Seats given up by cancelled or moved enrollments go to the waitlist first, the rest are
+    released. Returns how many waitlisted enrollments were promoted.
+    """
+    promoted = promote_waitlisted(section_id, semester_id, count)
+    if promoted < count:
+        release_seats(section_id, semester_id, count - promoted)
+    return promoted
+
+
+def rebalance_waitlist(section_id, semester_id):
+    """
+    Promotes as many waitlisted enrollments as there are free seats, e.g. after the capacity was raised.
+    """
+    waiting = models.Enrollment.objects.filter(
+        section_id=section_id, semester_id=semester_id, status=models.Enrollment.WAITLISTED).count()
+    if not waiting:
+        return 0
+    with transaction.atomic():
+        taken = reserve_available_seats(section_id, semester_id, waiting)
+        promoted = promote_waitlisted(section_id, semester_id, taken)
+        if promoted < taken:
+            release_seats(section_id, semester_id, taken - promoted)
+    return promoted
+
+
+def move_seat(old, new):
+    """
+    Applies an enrollment change to the seat counters and waitlists, old and new being
+    (section_id, semester_id, status) before and after the change. Returns the waitlist
+    fields to save the enrollment with, and the status when a waiting student got a seat.
+    """
+    same_section = old[:2] == new[:2]
+    fields = {}
+    if new[2] == models.Enrollment.WAITLISTED and not same_section:
+        # A waiting student moved to a section with room takes a seat straight away.
+        fields = seat_or_waitlist(new[0], new[1]) or {'status': models.Enrollment.PENDING, 'waitlist_position': None}
+    elif new[2] == models.Enrollment.WAITLISTED and old[2] != models.Enrollment.WAITLISTED:
+        fields['waitlist_position'] = join_waitlist(new[0], new[1])
+    elif new[2] != models.Enrollment.WAITLISTED and old[2] == models.Enrollment.WAITLISTED:
+        fields['waitlist_position'] = None
+
+    if holds_seat(new[2]) and not (same_section and holds_seat(old[2])):
+        reserve_seats(new[0], new[1])
+    if holds_seat(old[2]) and not (same_section and holds_seat(new[2])):
+        free_seats(old[0], old[1])
+    return fields
+
+
+@receiver(post_save, sender=models.Section, dispatch_uid='sync_section_capacity')
+def sync_section_capacity(sender, instance, created, **kwargs):
+    if created:
+        return
+    seats = models.SectionSeat.objects.filter(section=instance, semester_id=semesters.current_semester_id())
+    if seats.exclude(capacity=instance.capacity).update(capacity=instance.capacity):
+        for semester_id in seats.values_list('semester_id', flat=True):
+            rebalance_waitlist(instance.id, semester_id)
+
+
+# The statuses each bulk transition may start from.
+ALLOWED_TRANSITIONS = {
+    models.Enrollment.APPROVED: [models.Enrollment.PENDING],
+    models.Enrollment.CANCELLED: [models.Enrollment.PENDING, models.Enrollment.APPROVED,
+                                  models.Enrollment.WAITLISTED],
+}
+
+
+@transaction.atomic()
+def transition_enrollments(enrollments, status):
+    """
+    Moves the enrollments of a queryset that are allowed to reach status in one UPDATE and
+    returns the counts. The seats of cancelled enrollments go to the waitlists.
+    """
+    # Writes come before reads: on SQLite a transaction that read first cannot take the write
+    # lock once another one holds it, and fails instead of waiting.
+    candidates = enrollments.filter(status__in=ALLOWED_TRANSITIONS[status])
+    if status != models.Enrollment.CANCELLED:
+        updated = candidates.update(status=status)
+        matched = enrollments.count()
+        return {'matched': matched, 'updated': updated, 'skipped': matched - updated, 'promoted': 0}
+
+    # The rows are locked before the seats they free are counted, so the UPDATE moves exactly
+    # those. The no-op UPDATE takes the lock on SQLite, which ignores select_for_update().
+    candidates.update(status=F('status'))
+    matched = enrollments.count()
+    rows = list(candidates.select_for_update().values_list('id', 'section_id', 'semester_id', 'status'))
+    updated = models.Enrollment.objects.filter(id__in=[row[0] for row in rows])\
+        .update(status=status, waitlist_position=None)
+    freed = {}
+    for _, section_id, semester_id, old_status in rows:
+        if holds_seat(old_status):
+            freed[section_id, semester_id] = freed.get((section_id, semester_id), 0) + 1
+    promoted = sum(free_seats(section_id, semester_id, count)
+                   for (section_id, semester_id), count in freed.items())
+    return {'matched': matched, 'updated': updated, 'skipped': matched - updated, 'promoted': promoted}
+
+
+def annotate_remaining_seats(sections, semester_id=None):
+    """
+    Adds remaining_seats to a Section queryset, read from the seat counters of the semester,
+    the current one by default. Enrollments are only counted for the sections that have no counter yet.
+    """
+    if semester_id is None:
+        semester_id = semesters.current_semester_id()
+    seats = models.SectionSeat.objects.filter(semester_id=semester_id, section_id=OuterRef('pk'))\
+        .annotate(remaining=F('capacity') - F('reserved')).values('remaining')[:1]
+    taken = models.Enrollment.objects.filter(
+        semester_id=semester_id, section_id=OuterRef('pk'), status__in=SEAT_HOLDING_STATUSES).values('section_id')\
+        .annotate(taken=Count('id')).values('taken')
+    remaining = Coalesce(Subquery(seats), F('capacity') - Coalesce(Subquery(taken), 0),
+                         output_field=IntegerField())
+    return sections.annotate(remaining_seats=Greatest(remaining, Value(0), output_field=IntegerField()))
+
+
+def find_item_errors(items, semester):
+    """
+    Checks every item against the database with one query per rule and returns {index: [errors]}.
+    """
+    student_ids = {item['student'] for item in items}
+    course_ids = {item['course'] for item in items}
+
+    students = set(models.Student.objects.filter(user_id__in=student_ids).values_list('user_id', flat=True))
+    offered_courses = set(semester.courses.filter(id__in=course_ids).values_list('id', flat=True))
+    section_courses = dict(models.Section.objects.filter(
+        id__in={item['section'] for item in items}).values_list('id', 'course_id'))
+    existing = models.Enrollment.objects.filter(
+        semester=semester, student_id__in=student_ids, course_id__in=course_ids,
+    ).values_list('student_id', 'course_id', 'section_id', 'status')
+    existing_sections = {(student, course, section) for student, course, section, _ in existing}
+    enrolled_courses = {(student, course) for student, course, _, status in existing
+                        if status != models.Enrollment.CANCELLED}
+
+    errors, seen = {}, set()
+    for index, item in enumerate(items):
+        key = (item['student'], item['course'])
+        item_errors = []
+        if item['student'] not in students:
+            item_errors.append('Student does not exist')
+        if item['course'] not in offered_courses:
+            item_errors.append('Course is not offered in the current semester')
+        if section_courses.get(item['section']) != item['course']:
+            item_errors.append('Section does not belong to the course')
+        if (*key, item['section']) in existing_sections or key in enrolled_courses:
+            item_errors.append('Student is already enrolled in the course')
+        elif key in seen:
+            item_errors.append('Duplicate of an earlier item')
+        seen.add(key)
+        if item_errors:
+            errors[index] = item_errors
+    return errors
+
+
+def reserve_bulk_seats(items, enrollments, semester):
+    """
+    Takes the seats of the enrollments section by section, in item order. The ones that
+    did not get a seat are put on the waitlist in the same order.
+    """
+    by_section = {}
+    for index in enrollments:
+        by_section.setdefault(items[index]['section'], []).append(index)
+    for section_id, indexes in by_section.items():
+        taken = reserve_available_seats(section_id, semester.id, len(indexes))
+        if taken == len(indexes):
+            continue
+        position = join_waitlist(section_id, semester.id, len(indexes) - taken)
+        for offset, index in enumerate(indexes[taken:]):
+            enrollments[index].status = models.Enrollment.WAITLISTED
+            enrollments[index].waitlist_position = position + offset
+
+
+def bulk_enroll(items, semester):
+    """
+    Validates the items, a list of serializers.BulkEnrollmentItemSerializer data, and creates the
+    enrollments of the valid ones with one bulk insert. Returns a result per item.
+    """
+    errors = find_item_errors(items, semester)
+    enrollments = {
+        index: models.Enrollment(
+            student_id=item['student'], course_id=item['course'], section_id=item['section'],
+            semester_id=semester.id, school_year_id=semester.school_year_id,
+            has_scholarship=item['has_scholarship'])
+        for index, item in enumerate(items) if index not in errors
+    }
+    try:
+        with transaction.atomic():
+            reserve_bulk_seats(items, enrollments, semester)
+            models.Enrollment.objects.bulk_create(enrollments.values())
+    except IntegrityError:
+        raise BulkEnrollmentError('Some of the enrollments were created meanwhile, submit them again')
+
+    results = []
+    for index in range(len(items)):
+        if index in errors:
+            results.append({'index': index, 'status': 'error', 'errors': errors[index]})
+        elif enrollments[index].status == models.Enrollment.WAITLISTED:
+            results.append({'index': index, 'status': 'waitlisted', 'id': enrollments[index].id,
+                            'waitlist_position': enrollments[index].waitlist_position})
+        else:
+            results.append({'index': index, 'status': 'created', 'id': enrollments[index].id})
+    return results
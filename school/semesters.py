@@ -0,0 +1,94 @@
+"""
+The ids of the current semester and school year, held in process so the views filter on
+literal ids instead of joining Semester on is_current. Saving a semester bumps a version
+stamp in the shared cache (see CACHES in the settings), which makes every process load them again.
+
+Also assigns courses to semesters through the Semester.courses table directly.
+"""
+from collections import namedtuple
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import models
+from .utility import bump_version_stamp, get_version_stamp
+
+CURRENT_SEMESTER_VERSION_CACHE_KEY = 'current-semester:version'
+
+# Both ids are None while there is no current semester.
+CurrentSemester = namedtuple('CurrentSemester', ['semester_id', 'school_year_id'])
+
+_current = None
+_current_version = None
+
+
+def load_current_semester():
+    row = models.Semester.objects.filter(is_current=True).values_list('id', 'school_year_id').first()
+    return CurrentSemester(*row) if row else CurrentSemester(None, None)
+
+
+def get_current_semester():
+    global _current, _current_version
+    version = get_version_stamp(CURRENT_SEMESTER_VERSION_CACHE_KEY)
+    if _current is None or version != _current_version:
+        _current, _current_version = load_current_semester(), version
+    return _current
+
+
+def current_semester_id():
+    return get_current_semester().semester_id
+
+
+@receiver(post_save, sender=models.Semester, dispatch_uid='invalidate_current_semester_on_save')
+@receiver(post_delete, sender=models.Semester, dispatch_uid='invalidate_current_semester_on_delete')
+def invalidate_current_semester(sender=None, **kwargs):
+    bump_version_stamp(CURRENT_SEMESTER_VERSION_CACHE_KEY)
+
+
+class UnknownCourseError(Exception):
+    pass
+
+
+SemesterCourse = models.Semester.courses.through
+
+
+def assign_all_courses(semester_id):
+    """
+    Offers every course in the semester with a single INSERT ... SELECT, the course ids never
+    leave the database. Returns the number of courses added.
+    """
+    through, course = SemesterCourse._meta, models.Course._meta
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(through.db_table)} ({quote(through.get_field("semester").column)}, '
+            f'{quote(through.get_field("course").column)}) '
+            f'SELECT %s, {quote(course.pk.column)} FROM {quote(course.db_table)} '
+            f'WHERE {quote(course.pk.column)} NOT IN (SELECT {quote(through.get_field("course").column)} '
+            f'FROM {quote(through.db_table)} WHERE {quote(through.get_field("semester").column)} = %s)',
+            [semester_id, semester_id])
+        return cursor.rowcount
+
+
+@transaction.atomic()
+def change_courses(semester_id, add=(), remove=()):
+    """
+    Adds and removes courses of a semester with statements on the through table only: one
+    query checks the new course ids, one finds those already offered, one bulk insert and
+    one DELETE. Returns (added, removed).
+    """
+    add, remove = set(add) - set(remove), set(remove)
+    removed = 0
+    if remove:
+        removed, _ = SemesterCourse.objects.filter(semester_id=semester_id, course_id__in=remove).delete()
+    if not add:
+        return 0, removed
+
+    unknown = add - set(models.Course.objects.filter(id__in=add).values_list('id', flat=True))
+    if unknown:
+        raise UnknownCourseError(f'Courses {sorted(unknown)} do not exist')
+    offered = set(SemesterCourse.objects.filter(semester_id=semester_id, course_id__in=add)
+                  .values_list('course_id', flat=True))
+    SemesterCourse.objects.bulk_create(
+        [SemesterCourse(semester_id=semester_id, course_id=course_id) for course_id in add - offered],
+        batch_size=1000)
+    return len(add - offered), removed
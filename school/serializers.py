@@ -1,8 +1,9 @@
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.core.validators import FileExtensionValidator
 from rest_framework import serializers
 from core.serializers import UserCreateSerializer, SimpleUserSerializer
-from . import models
+from . import models, jobs, attendance, semesters
 
 
 class SchoolYearSerializer(serializers.ModelSerializer):
@@ -150,10 +151,9 @@ class SemesterSerializer(serializers.ModelSerializer):
     @transaction.atomic()
     def create(self, validated_data):
         semester = models.Semester.objects.create(**validated_data)
-        courses = models.Course.objects \
-            .select_related('prerequisite') \
-            .prefetch_related('departments').all().distinct()
-        semester.courses.set(courses)
+        semesters.assign_all_courses(semester.id)
+        # For the response, which lists the courses with their departments.
+        prefetch_related_objects([semester], 'courses__departments')
 
         return semester
 
@@ -163,6 +163,11 @@ class SemesterSerializer(serializers.ModelSerializer):
                   'enrollment_end_date', 'start_date', 'end_date', 'courses']
 
 
+class SemesterCourseChangesSerializer(serializers.Serializer):
+    courses_to_add_ids = serializers.ListField(child=serializers.IntegerField(), default=list)
+    courses_to_remove_ids = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+
 class BuildingAddressSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         building_id = self.context['building_id']
@@ -480,17 +485,27 @@ class ClassTimeSerializer(serializers.ModelSerializer):
 class SectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Section
-        fields = ['id', 'name', 'course', 'classroom', 'classtime']
+        fields = ['id', 'name', 'course', 'classroom', 'classtime', 'capacity']
 
 
 class ReadSectionSerializer(serializers.ModelSerializer):
     course = SimpleCourseSerializer()
     classroom = SimpleClassRoomSerializer()
     classtime = ClassTimeSerializer()
+    # Annotated by registration.annotate_remaining_seats
+    remaining_seats = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = models.Section
-        fields = ['id', 'name', 'course', 'classroom', 'classtime']
+        fields = ['id', 'name', 'course', 'classroom', 'classtime', 'capacity', 'remaining_seats']
+
+
+class SectionSeatsSerializer(serializers.ModelSerializer):
+    remaining_seats = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = models.Section
+        fields = ['id', 'name', 'capacity', 'remaining_seats']
 
 
 class SimpleSemesterSerializer(serializers.ModelSerializer):
@@ -511,7 +526,19 @@ class AttendanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Attendance
         fields = ['id', 'student', 'school_year', 'semester',
-                  'course', 'section', 'mark', 'comment']
+                  'course', 'section', 'mark', 'comment', 'date']
+
+
+class AttendanceMarkSerializer(serializers.Serializer):
+    # Plain integers: the ids are checked against the database for the whole class at once.
+    student = serializers.IntegerField()
+    school_year = serializers.IntegerField()
+    semester = serializers.IntegerField()
+    course = serializers.IntegerField()
+    section = serializers.IntegerField(required=False)
+    mark = serializers.ChoiceField(choices=models.Attendance.MARK_CHOICES)
+    comment = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    date = serializers.DateField(required=False)
 
 
 class ReadAttendanceSerializer(serializers.ModelSerializer):
@@ -524,14 +551,41 @@ class ReadAttendanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Attendance
         fields = ['id', 'student', 'school_year', 'semester',
-                  'course', 'section', 'mark', 'comment', 'created_at']
+                  'course', 'section', 'mark', 'comment', 'date', 'created_at']
+
+
+class LeanAttendanceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Attendance
+        fields = ['id', 'student', 'mark', 'comment', 'date']
+
+
+class AttendanceHistoryQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(default=100, min_value=1, max_value=1000)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    student = serializers.IntegerField(required=False)
+    lean = serializers.BooleanField(default=False)
+
+    def validate_cursor(self, value):
+        try:
+            return attendance.decode_cursor(value)
+        except ValueError:
+            raise serializers.ValidationError('Invalid cursor')
 
 
 class EnrollmentSerializer(serializers.ModelSerializer):
+    def validate_status(self, value):
+        if value == models.Enrollment.WAITLISTED and getattr(self.instance, 'status', None) != value:
+            raise serializers.ValidationError('Enrollments are only waitlisted when their section is full')
+        return value
+
     class Meta:
         model = models.Enrollment
         fields = ['id', 'student', 'course', 'section', 'semester',
-                  'school_year', 'status', 'has_scholarship']
+                  'school_year', 'status', 'waitlist_position', 'has_scholarship']
+        read_only_fields = ['waitlist_position']
 
 
 class ReadEnrollmentSerializer(serializers.ModelSerializer):
@@ -552,11 +606,36 @@ class ReadEnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Enrollment
         fields = ['id', 'student', 'course', 'section', 'price_per_credit', 'credit',
-                  'semester', 'school_year', 'status', 'has_scholarship', 'date']
+                  'semester', 'school_year', 'status', 'waitlist_position', 'has_scholarship', 'date']
+
+
+class BulkEnrollmentItemSerializer(serializers.Serializer):
+    # Plain integers: the ids are checked against the database for the whole batch at once.
+    student = serializers.IntegerField()
+    course = serializers.IntegerField()
+    section = serializers.IntegerField()
+    has_scholarship = serializers.BooleanField(default=False)
+
+
+class EnrollmentTransitionSerializer(serializers.Serializer):
+    ACTIONS = {'approve': models.Enrollment.APPROVED, 'cancel': models.Enrollment.CANCELLED}
+    FILTERS = ['section', 'course', 'semester', 'student']
+
+    action = serializers.ChoiceField(choices=list(ACTIONS))
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    section = serializers.IntegerField(required=False)
+    course = serializers.IntegerField(required=False)
+    semester = serializers.IntegerField(required=False)
+    student = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and not any(name in attrs for name in self.FILTERS):
+            raise serializers.ValidationError('Give the enrollment ids or at least one of ' + ', '.join(self.FILTERS))
+        return attrs
 
 
 class CourseAndSectionsSerializer(serializers.ModelSerializer):
-    sections = SimpleSectionSerializer(many=True)
+    sections = SectionSeatsSerializer(many=True)
 
     class Meta:
         model = models.Course
@@ -593,7 +672,20 @@ class SectionClassroomClasstimeSerializer(serializers.ModelSerializer):
 
 
 class UploadGradeSerializer(serializers.Serializer):
-    excel_file = serializers.FileField(validators=[FileExtensionValidator(allowed_extensions=['xlsx'])])
+    excel_file = serializers.FileField(validators=[FileExtensionValidator(allowed_extensions=['xlsx', 'csv'])])
+    mode = serializers.ChoiceField(choices=models.GradeImportJob.MODE_CHOICES, default=models.GradeImportJob.CREATE)
+
+
+class GradeImportJobSerializer(serializers.ModelSerializer):
+    rows_processed = serializers.SerializerMethodField()
+
+    def get_rows_processed(self, job):
+        return jobs.get_rows_processed(job)
+
+    class Meta:
+        model = models.GradeImportJob
+        fields = ['id', 'teach', 'mode', 'status', 'rows_processed', 'errors', 'report',
+                  'created_at', 'started_at', 'finished_at']
 
 
 class GradeSerializer(serializers.ModelSerializer):
@@ -604,69 +696,37 @@ class GradeSerializer(serializers.ModelSerializer):
 
 
 class ReadGradeSerializer(serializers.ModelSerializer):
-    POINT_FOR_LETTER_A_GRADE = 4
-    POINT_FOR_LETTER_B_GRADE = 3
-    POINT_FOR_LETTER_C_GRADE = 2
-    POINT_FOR_LETTER_D_GRADE = 1
-
     student = SimpleStudentSerializer()
     school_year = SchoolYearSerializer()
     semester = SimpleSemesterSerializer()
     course = SimpleCourseSerializer()
     section = SimpleSectionSerializer()
-    letter = serializers.SerializerMethodField()
-    grade_point = serializers.SerializerMethodField()
-    total_score = serializers.SerializerMethodField()
-
-    def get_letter(self, obj):
-        grades = self.grades_list(obj)
-
-        if not sum(grades):
-            return 'NG'
-        
-        for grade in grades:
-            if grade == 0:
-                return "I"
-            
-        score = self.grade_aggregate(obj)
-        if score >= 90:
-            return 'A'
-        if score >= 80:
-            return 'B'
-        if score >= 70:
-            return 'C'
-        if score >= 60:
-            return 'D'
-        return 'F'
-    
-    def get_total_score(self, obj):
-        return self.grade_aggregate(obj)
-    
-    def grades_list(self, obj):
-        return [int(obj.attendance), int(obj.assignment), int(obj.quiz), int(obj.midterm), int(obj.project), int(obj.final)]
-        
-    def grade_aggregate(self, obj):
-        return int(obj.attendance) + int(obj.assignment) + int(obj.quiz) + int(obj.midterm) + int(obj.project) + int(obj.final)
-
-    def get_grade_point(self, obj):
-        credit = models.Course.objects.get(code=obj.course.code).credit
-        return self.calc_grade_point(credit, self.grade_aggregate(obj))
-            
-    def calc_grade_point(self, credit, score):
-        if score >= 90:
-            return credit * self.POINT_FOR_LETTER_A_GRADE
-        if score >= 80:
-            return credit * self.POINT_FOR_LETTER_B_GRADE
-        if score >= 70:
-            return credit * self.POINT_FOR_LETTER_C_GRADE
-        if score >= 60:
-            return credit * self.POINT_FOR_LETTER_D_GRADE
-        return 0
 
     class Meta:
         model = models.Grade
         fields = ['id', 'student', 'school_year', 'semester', 'course', 'section', 'attendance', 'quiz', 
                   'assignment', 'midterm', 'project', 'final', 'letter', 'grade_point', 'total_score', 'graded_at']
+        read_only_fields = ['letter', 'grade_point', 'total_score']
+
+
+class AcademicSummarySerializer(serializers.ModelSerializer):
+    student = SimpleStudentSerializer()
+    student_number = serializers.CharField(source='student.student_number')
+
+    class Meta:
+        model = models.StudentAcademicSummary
+        fields = ['student', 'student_number', 'attempted_credits', 'earned_credits', 'quality_points',
+                  'gpa', 'updated_at']
+
+
+class SemesterSummarySerializer(serializers.ModelSerializer):
+    student = SimpleStudentSerializer()
+    student_number = serializers.CharField(source='student.student_number')
+
+    class Meta:
+        model = models.StudentSemesterSummary
+        fields = ['student', 'student_number', 'school_year', 'semester', 'attempted_credits',
+                  'earned_credits', 'quality_points', 'gpa', 'updated_at']
 
 
 class SchoolYearSemesterSerializer(serializers.ModelSerializer):
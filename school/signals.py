@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with `grades`, a queryset of the Grade rows that were just inserted or updated, by
+# every code path that writes grades, bulk ones included, inside the writing transaction.
+grades_written = Signal()
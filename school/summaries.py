@@ -0,0 +1,112 @@
+"""
+Per-semester and cumulative academic summaries of students, refreshed incrementally from
+the grades_written signal so ranked and filtered student lists never aggregate Grade.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.dispatch import receiver
+from . import models
+from .grading import get_semester_totals, gpa
+from .signals import grades_written
+
+TOTAL_FIELDS = ['attempted_credits', 'earned_credits', 'quality_points']
+
+
+def to_gpa(quality_points, attempted_credits):
+    return Decimal(str(gpa(quality_points, attempted_credits)))
+
+
+def compute_semester_summaries(grades):
+    """
+    Unsaved StudentSemesterSummary rows of every (student, semester) found in grades, in one query.
+    """
+    return [
+        models.StudentSemesterSummary(
+            student_id=totals['student_id'], school_year_id=totals['school_year_id'],
+            semester_id=totals['semester_id'], gpa=to_gpa(totals['quality_points'], totals['attempted_credits']),
+            **{field: totals[field] for field in TOTAL_FIELDS})
+        for totals in get_semester_totals(grades, 'student_id')
+    ]
+
+
+def compute_academic_summaries(semester_summaries):
+    """
+    Unsaved StudentAcademicSummary rows summing a StudentSemesterSummary queryset per student, in one query.
+    """
+    totals = semester_summaries.values('student_id').annotate(
+        **{field: Sum(field) for field in TOTAL_FIELDS}).order_by()
+    return [
+        models.StudentAcademicSummary(
+            student_id=row['student_id'], gpa=to_gpa(row['quality_points'], row['attempted_credits']),
+            **{field: row[field] for field in TOTAL_FIELDS})
+        for row in totals
+    ]
+
+
+def save_summaries(model, summaries, unique_fields):
+    model.objects.bulk_create(
+        summaries, batch_size=500, update_conflicts=True, unique_fields=unique_fields,
+        update_fields=[*TOTAL_FIELDS, 'gpa', 'updated_at'])
+
+
+@transaction.atomic()
+def refresh_summaries(grades):
+    """
+    Recomputes the summaries of the students and semesters of a Grade queryset: only
+    those semesters' grades are aggregated, and the cumulative rows are summed from
+    the semester rows.
+    """
+    student_ids = grades.values('student_id')
+    affected_grades = models.Grade.objects.filter(
+        student_id__in=student_ids, semester_id__in=grades.values('semester_id'))
+    save_summaries(models.StudentSemesterSummary, compute_semester_summaries(affected_grades),
+                   ['student', 'semester'])
+    save_summaries(models.StudentAcademicSummary, compute_academic_summaries(
+        models.StudentSemesterSummary.objects.filter(student_id__in=student_ids)), ['student'])
+
+
+@receiver(grades_written, dispatch_uid='refresh_academic_summaries')
+def refresh_summaries_on_grades_written(sender, grades, **kwargs):
+    refresh_summaries(grades)
+
+
+@transaction.atomic()
+def rebuild_summaries():
+    """
+    Drops every summary and recomputes them from all grades.
+    """
+    models.StudentAcademicSummary.objects.all().delete()
+    models.StudentSemesterSummary.objects.all().delete()
+    models.StudentSemesterSummary.objects.bulk_create(
+        compute_semester_summaries(models.Grade.objects.all()), batch_size=500)
+    models.StudentAcademicSummary.objects.bulk_create(
+        compute_academic_summaries(models.StudentSemesterSummary.objects.all()), batch_size=500)
+
+
+def compare(model, expected, stored):
+    return [(model.__name__, key, stored.get(key), expected.get(key))
+            for key in expected.keys() | stored.keys() if stored.get(key) != expected.get(key)]
+
+
+def verify_summaries():
+    """
+    Compares the stored summaries with ones computed from the grades and returns the
+    differences as a list of (model name, key, stored values, expected values).
+    """
+    fields = [*TOTAL_FIELDS, 'gpa']
+    expected_semesters, student_totals = {}, {}
+    for row in compute_semester_summaries(models.Grade.objects.all()):
+        expected_semesters[row.student_id, row.semester_id] = tuple(getattr(row, field) for field in fields)
+        totals = student_totals.setdefault(row.student_id, [0] * len(TOTAL_FIELDS))
+        for i, field in enumerate(TOTAL_FIELDS):
+            totals[i] += getattr(row, field)
+    expected_students = {
+        student_id: (*totals, to_gpa(totals[2], totals[0])) for student_id, totals in student_totals.items()}
+
+    stored_semesters = {(row[0], row[1]): row[2:] for row in models.StudentSemesterSummary.objects.values_list(
+        'student_id', 'semester_id', *fields)}
+    stored_students = {row[0]: row[1:] for row in models.StudentAcademicSummary.objects.values_list(
+        'student_id', *fields)}
+    return compare(models.StudentSemesterSummary, expected_semesters, stored_semesters) + \
+        compare(models.StudentAcademicSummary, expected_students, stored_students)
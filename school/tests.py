@@ -1,3 +1,137 @@
-from django.test import TestCase
+"""
+Concurrency tests of the seat counters and waitlists. The requests of a scenario run in
+threads released by the same signal, so they really overlap on the database.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from . import models, registration
+from .management.synthetic import seed_school
 
-# Create your tests here.
+THREADS = 8
+CAPACITY = 20
+
+
+def run_together(function, arguments):
+    start = threading.Event()
+
+    def task(argument):
+        start.wait()
+        try:
+            return function(argument)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        futures = [executor.submit(task, argument) for argument in arguments]
+        start.set()
+        return [future.result() for future in futures]
+
+
+class SeatContentionTests(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The threads wait on each other's write locks instead of failing after SQLite's 5 seconds.
+        cls.old_options = dict(connection.settings_dict['OPTIONS'])
+        connection.settings_dict['OPTIONS']['timeout'] = 60
+
+    @classmethod
+    def tearDownClass(cls):
+        connection.settings_dict['OPTIONS'] = cls.old_options
+        super().tearDownClass()
+
+    def setUp(self):
+        school = seed_school(students=3 * CAPACITY, courses=3)
+        self.school_year, self.semester = school['school_year'], school['semester']
+        self.students = school['students']
+        self.section, self.other = school['sections'][1:]
+        for section in (self.section, self.other):
+            section.capacity = CAPACITY
+            section.save()
+
+    def enroll(self, student):
+        with transaction.atomic():
+            return models.Enrollment.objects.create(
+                student=student, course_id=self.section.course_id, section=self.section,
+                semester=self.semester, school_year=self.school_year,
+                **registration.seat_or_waitlist(self.section.id, self.semester.id))
+
+    def cancel(self, enrollment):
+        with transaction.atomic():
+            models.Enrollment.objects.filter(id=enrollment.id).update(status=models.Enrollment.CANCELLED)
+            registration.free_seats(self.section.id, self.semester.id)
+
+    def move(self, enrollment):
+        # What EnrollmentViewSet.update does when a student switches to the other section.
+        old = (enrollment.section_id, enrollment.semester_id, enrollment.status)
+        new = (self.other.id, enrollment.semester_id, enrollment.status)
+        with transaction.atomic():
+            fields = registration.move_seat(old, new)
+            models.Enrollment.objects.filter(id=enrollment.id).update(
+                section_id=self.other.id, course_id=self.other.course_id, **fields)
+
+    def rush(self):
+        """
+        Enrolls every student at once and returns (seat holders, waitlist in order).
+        """
+        enrollments = run_together(self.enroll, self.students)
+        holders = [e for e in enrollments if e.status != models.Enrollment.WAITLISTED]
+        waitlist = sorted((e for e in enrollments if e.status == models.Enrollment.WAITLISTED),
+                          key=lambda enrollment: enrollment.waitlist_position)
+        return holders, waitlist
+
+    def assertSeatsConsistent(self, section):
+        seat = models.SectionSeat.objects.get(section=section, semester=self.semester)
+        enrollments = models.Enrollment.objects.filter(section=section, semester=self.semester)
+        holders = enrollments.filter(status__in=registration.SEAT_HOLDING_STATUSES).count()
+        positions = list(enrollments.filter(status=models.Enrollment.WAITLISTED)
+                         .values_list('waitlist_position', flat=True))
+        self.assertEqual(seat.reserved, holders, 'the seat counter drifted from the enrollments')
+        self.assertLessEqual(holders, seat.capacity, 'the section was oversold')
+        self.assertEqual(len(set(positions)), len(positions), 'two enrollments share a waitlist position')
+        if positions:
+            self.assertEqual(holders, seat.capacity, 'a seat is free while students are waiting')
+
+    def assertPromotedInOrder(self, waitlist, count):
+        statuses = dict(models.Enrollment.objects.filter(id__in=[e.id for e in waitlist])
+                        .values_list('id', 'status'))
+        self.assertEqual([statuses[e.id] != models.Enrollment.WAITLISTED for e in waitlist],
+                         [True] * count + [False] * (len(waitlist) - count))
+
+    def test_enroll_rush_neither_oversells_nor_skips_positions(self):
+        holders, waitlist = self.rush()
+        self.assertEqual(len(holders), CAPACITY)
+        self.assertEqual(len(waitlist), 2 * CAPACITY)
+        self.assertSeatsConsistent(self.section)
+
+    def test_cancellations_promote_the_head_of_the_waitlist(self):
+        holders, waitlist = self.rush()
+        run_together(self.cancel, holders[::2])
+        self.assertSeatsConsistent(self.section)
+        self.assertPromotedInOrder(waitlist, len(holders[::2]))
+
+    def test_moved_seats_promote_the_head_of_the_waitlist(self):
+        holders, waitlist = self.rush()
+        # Seat holders free their seats, waitlisted students join the other section's waitlist or a seat there.
+        run_together(self.move, holders[:CAPACITY // 2] + waitlist[-CAPACITY // 2:])
+        self.assertSeatsConsistent(self.section)
+        self.assertSeatsConsistent(self.other)
+        self.assertPromotedInOrder(waitlist[:-CAPACITY // 2], CAPACITY // 2)
+        self.assertEqual(models.SectionSeat.objects.get(section=self.other, semester=self.semester).reserved,
+                         CAPACITY)
+
+    def test_overlapping_bulk_cancellations_free_each_seat_once(self):
+        holders, waitlist = self.rush()
+        ids = [e.id for e in holders[:CAPACITY // 2]]
+        batches = [ids[:6], ids[3:9], ids[6:], ids]
+        results = run_together(
+            lambda batch: registration.transition_enrollments(
+                models.Enrollment.objects.filter(id__in=batch), models.Enrollment.CANCELLED),
+            batches)
+        self.assertEqual(sum(result['updated'] for result in results), len(ids))
+        self.assertEqual(sum(result['promoted'] for result in results), len(ids))
+        self.assertSeatsConsistent(self.section)
+        self.assertPromotedInOrder(waitlist, len(ids))
@@ -28,6 +28,10 @@ router.register('only-courses-with-sections',
                 views.OnlyCourseWithSectionViewSet, basename='semester-courses-sections')
 router.register('teach-update', views.TeachUpdateViewSet)
 router.register('grades', views.GradeViewSet, basename='grades')
+router.register('academic-summaries', views.AcademicSummaryViewSet)
+router.register('cache-stats', views.CacheStatsViewSet, basename='cache-stats')
+router.register('bulk-enrollments', views.BulkEnrollmentViewSet, basename='bulk-enrollments')
+router.register('enrollment-transitions', views.EnrollmentTransitionViewSet, basename='enrollment-transitions')
 
 departments_router = routers.NestedDefaultRouter(
     router, 'departments', lookup='departments')
@@ -35,6 +39,8 @@ departments_router.register(
     'address', views.DepartmentAddressViewSet, basename='department-address')
 departments_router.register(
     'contacts', views.DepartmentContactViewSet, basename='department-contacts')
+departments_router.register(
+    'eligibility', views.DepartmentEligibilityViewSet, basename='department-eligibility')
 
 buildings_router = routers.NestedDefaultRouter(
     router, 'buildings', lookup='buildings')
@@ -45,6 +51,8 @@ sections_router = routers.NestedDefaultRouter(
     router, 'sections', lookup='sections')
 sections_router.register(
     'attendances', views.AttendanceViewSet, basename='section-attendances')
+sections_router.register(
+    'attendance-summary', views.AttendanceSummaryViewSet, basename='section-attendance-summary')
 sections_router.register('current-semester-section-enrollments',
                          views.CurrentSemesterSectionEnrollmentViewSet, basename='curr-sem-sec-enrollments')
 sections_router.register('classroom',
@@ -52,6 +60,15 @@ sections_router.register('classroom',
 sections_router.register('classtime',
                          views.SectionClasstimeViewSet, basename='section-classtime')
 
+semesters_router = routers.NestedDefaultRouter(
+    router, 'semesters', lookup='semesters')
+semesters_router.register(
+    'grades-export', views.SemesterGradeExportViewSet, basename='semester-grades-export')
+semesters_router.register(
+    'academic-summaries', views.SemesterSummaryViewSet, basename='semester-academic-summaries')
+semesters_router.register(
+    'grade-statistics', views.GradeStatisticsViewSet, basename='semester-grade-statistics')
+
 students_router = routers.NestedDefaultRouter(
     router, 'students', lookup='students')
 students_router.register(
@@ -59,6 +76,7 @@ students_router.register(
 students_router.register(
     'eligible-courses', views.StudentEligibleCourseViewSet, basename='student-enrolls')
 students_router.register('grades', views.StudentGradeAccessViewSet, basename='student-grade')
+students_router.register('transcript', views.StudentTranscriptViewSet, basename='student-transcript')
 students_router.register('school-years', views.StudentEnrollmentSchoolYearViewSet, basename='student-school-years')
 
 teachers_router = routers.NestedDefaultRouter(
@@ -72,6 +90,9 @@ teachers_router.register('teaches', views.TeachUpdateViewSet)
 deeply_nested_teaches_router = routers.NestedDefaultRouter(teachers_router, 'teaches', lookup='teaches')
 deeply_nested_teaches_router.register('grades', views.GradeViewSet)
 deeply_nested_teaches_router.register('teach-grades', views.TeacherTeachGradeViewSet, basename='teach-grades')
+deeply_nested_teaches_router.register('grade-imports', views.GradeImportJobViewSet, basename='teach-grade-imports')
+deeply_nested_teaches_router.register('grades-export', views.TeachGradeExportViewSet, basename='teach-grades-export')
+deeply_nested_teaches_router.register('grade-template', views.GradeTemplateViewSet, basename='teach-grade-template')
 
 students_router.register('schoolyears', views.FakeSchoolYearViewSet, basename='a')
 nested_sch_years_router = routers.NestedDefaultRouter(students_router, 'schoolyears', lookup='school_years')
@@ -84,6 +105,7 @@ urlpatterns = [
     path("", include(departments_router.urls)),
     path("", include(buildings_router.urls)),
     path("", include(sections_router.urls)),
+    path("", include(semesters_router.urls)),
     path("", include(students_router.urls)),
     path("", include(teachers_router.urls)),
     path("", include(deeply_nested_teaches_router.urls)),
@@ -1,5 +1,10 @@
 import os
-from django.db.models import F, Max
+import threading
+import uuid
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models import Case, F, Max, Value, When
 
 def image_upload_path(instance, filename):
     instance_id = str(instance.user.id)
@@ -16,6 +21,112 @@ def tor_upload_path(instance, filename):
     return file_path
 
 
+# The version stamps read during the current request, None outside of a request.
+_request_stamps = threading.local()
+
+
+def start_request_stamps(**kwargs):
+    _request_stamps.values = {}
+
+
+def end_request_stamps(**kwargs):
+    _request_stamps.values = None
+
+
+request_started.connect(start_request_stamps, dispatch_uid='start_request_version_stamps')
+request_finished.connect(end_request_stamps, dispatch_uid='end_request_version_stamps')
+
+
+def get_version_stamp(key):
+    """
+    The version stamp stored in the cache under key, created on first use. Data held in
+    process is reloaded whenever its stamp changes, which any process can do with bump_version_stamp
+    as long as the cache is shared by all of them. A request reads each stamp from the cache once.
+    """
+    values = getattr(_request_stamps, 'values', None)
+    if values is not None and key in values:
+        return values[key]
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    if values is not None:
+        values[key] = version
+    return version
+
+
+def bump_version_stamp(key):
+    def bump():
+        cache.set(key, uuid.uuid4().hex, timeout=None)
+        # The request that made the change sees it too.
+        values = getattr(_request_stamps, 'values', None)
+        if values is not None:
+            values.pop(key, None)
+    transaction.on_commit(bump)
+
+
+POINT_FOR_LETTER_A_GRADE = 4
+POINT_FOR_LETTER_B_GRADE = 3
+POINT_FOR_LETTER_C_GRADE = 2
+POINT_FOR_LETTER_D_GRADE = 1
+PASSING_SCORE = 60
+# Letters of grades that are not final yet and so do not count towards the GPA
+UNGRADED_LETTERS = ['NG', 'I']
+
+
+def grade_total_score(components):
+    return sum(int(component) for component in components)
+
+
+def grade_letter(components):
+    """
+    NG when nothing was graded, I when a component is still missing, otherwise the letter of the total score.
+    """
+    scores = [int(component) for component in components]
+
+    if not sum(scores):
+        return 'NG'
+    if 0 in scores:
+        return 'I'
+
+    score = sum(scores)
+    if score >= 90:
+        return 'A'
+    if score >= 80:
+        return 'B'
+    if score >= 70:
+        return 'C'
+    if score >= PASSING_SCORE:
+        return 'D'
+    return 'F'
+
+
+def grade_point(credit, score):
+    if score >= 90:
+        return credit * POINT_FOR_LETTER_A_GRADE
+    if score >= 80:
+        return credit * POINT_FOR_LETTER_B_GRADE
+    if score >= 70:
+        return credit * POINT_FOR_LETTER_C_GRADE
+    if score >= PASSING_SCORE:
+        return credit * POINT_FOR_LETTER_D_GRADE
+    return 0
+
+
+def grade_point_expression(credit, score_field='total_score'):
+    """
+    grade_point() as a database expression, credit being a field name or an expression.
+    """
+    credit = F(credit) if isinstance(credit, str) else credit
+    return Case(
+        When(**{f'{score_field}__gte': 90}, then=credit * POINT_FOR_LETTER_A_GRADE),
+        When(**{f'{score_field}__gte': 80}, then=credit * POINT_FOR_LETTER_B_GRADE),
+        When(**{f'{score_field}__gte': 70}, then=credit * POINT_FOR_LETTER_C_GRADE),
+        When(**{f'{score_field}__gte': PASSING_SCORE}, then=credit * POINT_FOR_LETTER_D_GRADE),
+        default=Value(0),
+    )
+
+
 current_id_number = 0
 
 def _student_id_number_generator():
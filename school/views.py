@@ -1,16 +1,21 @@
-import pandas as pd
-from django.db import transaction
-from django.db.models import Prefetch, Q
+import hashlib
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from core.models import User
 from core import serializers as core_serializers
-from . import models, serializers, permissions, filters
+from . import models, serializers, permissions, filters, grading, gradesheets, jobs, analytics, prerequisites, registration, \
+    attendance, semesters
 
 
 class Permission(ModelViewSet):
@@ -81,22 +86,29 @@ class CourseViewSet(Permission):
 
 class SemesterViewSet(Permission):
     queryset = models.Semester.objects.select_related('school_year').\
-        prefetch_related('courses').all()
+        prefetch_related('courses__departments').all()
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     ordering_fields = ['name', 'is_current']
 
+    def create(self, request, *args, **kwargs):
+        # Two semesters created at once can both try to become the current one, the loser
+        # hits the one_current_semester index and nothing of it is saved.
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            return Response({'error': 'Another semester was created at the same time, retry'},
+                            status=status.HTTP_409_CONFLICT)
+
+    @transaction.atomic()
     def partial_update(self, request, *args, **kwargs):
         semester = self.get_object()
-        courses_to_add_ids = request.data.get('courses_to_add_ids', [])
-        courses_to_remove_ids = request.data.get('courses_to_remove_ids', [])
-        if courses_to_add_ids:
-            existing_courses = semester.courses.all()
-            existing_courses_ids = existing_courses.values_list(
-                'id', flat=True)
-            combined_courses = list(existing_courses_ids) + courses_to_add_ids
-            semester.courses.set(combined_courses)
-        elif courses_to_remove_ids:
-            semester.courses.remove(*courses_to_remove_ids)
+        changes = serializers.SemesterCourseChangesSerializer(data=request.data)
+        changes.is_valid(raise_exception=True)
+        try:
+            semesters.change_courses(semester.id, changes.validated_data['courses_to_add_ids'],
+                                     changes.validated_data['courses_to_remove_ids'])
+        except semesters.UnknownCourseError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return super().partial_update(request, *args, **kwargs)
 
@@ -416,8 +428,12 @@ class ClassTimeViewSet(Permission):
 
 
 class SectionViewSet(Permission):
-    queryset = models.Section.objects.select_related('course').select_related('classtime')\
-        .select_related('classroom').all()
+    queryset = models.Section.objects.select_related('course')\
+        .select_related('classtime').select_related('classroom').all()
+
+    def get_queryset(self):
+        # Annotated per request, the current semester may have changed since the last one.
+        return registration.annotate_remaining_seats(super().get_queryset())
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -430,7 +446,7 @@ class CurrentSemesterCourseViewSet(Permission):
     serializer_class = serializers.CurrentSemesterCourseSerializer
 
     def get_queryset(self):
-        current_semester = models.Semester.objects.filter(is_current=True)
+        current_semester = models.Semester.objects.filter(id=semesters.current_semester_id())
         return current_semester
 
 
@@ -439,7 +455,7 @@ class AttendanceViewSet(ModelViewSet):
 
     def get_queryset(self):
         queryset = models.Attendance.objects.filter(section_id=self.kwargs['sections_pk'])\
-            .select_related('student').select_related('course')\
+            .select_related('student__user').select_related('course')\
             .select_related('school_year').select_related('semester').select_related('section')
         return queryset
 
@@ -448,13 +464,85 @@ class AttendanceViewSet(ModelViewSet):
             return serializers.ReadAttendanceSerializer
         return serializers.AttendanceSerializer
 
-    @transaction.atomic()
+    def list(self, request, *args, **kwargs):
+        """
+        The section's marks in date order, archived ones included, a page at a time: follow
+        "next". Takes ?date_from=, ?date_to=, ?student=, ?page_size= and ?lean=true for flat
+        rows without the nested objects. Archived marks keep their id but are read only, and
+        their created_at is the earliest one of their day.
+        """
+        query = serializers.AttendanceHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        rows = self.get_queryset()
+        if params['lean']:
+            rows = models.Attendance.objects.filter(section_id=self.kwargs['sections_pk'])
+        days = models.SectionAttendanceDay.objects.filter(section_id=self.kwargs['sections_pk'])
+        if 'date_from' in params:
+            rows, days = rows.filter(date__gte=params['date_from']), days.filter(date__gte=params['date_from'])
+        if 'date_to' in params:
+            rows, days = rows.filter(date__lte=params['date_to']), days.filter(date__lte=params['date_to'])
+        if 'student' in params:
+            rows = rows.filter(student_id=params['student'])
+
+        page, has_more = attendance.page_attendance_history(
+            rows, days, params['page_size'], params.get('cursor'), params.get('student'))
+        serializer_class = serializers.LeanAttendanceSerializer if params['lean'] else self.get_serializer_class()
+        next_url = None
+        if has_more:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', attendance.encode_cursor(attendance.attendance_key(page[-1])))
+        return Response({'next': next_url, 'results': serializer_class(page, many=True).data})
+
     def create(self, request, *args, **kwargs):
-        for attendance in request.data:
-            serializer = self.get_serializer(data=attendance)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        """
+        Takes the marks of a whole class: a list of {"student", "school_year", "semester",
+        "course", "mark", "comment", "date"}, the date defaulting to today.
+        """
+        serializer = serializers.AttendanceMarkSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            attendances, errors = attendance.bulk_mark_attendance(
+                int(self.kwargs['sections_pk']), serializer.validated_data)
+        except attendance.AttendanceError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        if errors:
+            return Response([errors.get(index, {}) for index in range(len(serializer.validated_data))],
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializers.AttendanceSerializer(attendances, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
+
+class AttendanceSummaryViewSet(ModelViewSet):
+    """
+    P/A/E/T counts, weighted attendance rate and the matching Grade.attendance score of every
+    student marked in a section, for ?semester= or the current semester.
+    """
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get']
+
+    def list(self, request, *args, **kwargs):
+        try:
+            semester_id = int(request.query_params['semester']) if request.query_params.get('semester') else \
+                semesters.current_semester_id()
+        except ValueError:
+            return Response({'error': 'The semester query parameter must be numeric'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if semester_id is None or not models.Semester.objects.filter(id=semester_id).exists():
+            return Response({'error': 'Semester does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        if not models.Section.objects.filter(id=self.kwargs['sections_pk']).exists():
+            return Response({'error': 'Section does not exist'}, status=status.HTTP_404_NOT_FOUND)
+
+        summary = attendance.get_attendance_summary(int(self.kwargs['sections_pk']), semester_id)
+        return Response({
+            'section': int(self.kwargs['sections_pk']), 'semester': semester_id,
+            'students': [{'student': student_id, **counts} for student_id, counts in sorted(summary.items())],
+        })
+
+
+def prefetch_section_seats():
+    return Prefetch('sections', queryset=registration.annotate_remaining_seats(models.Section.objects.all()))
 
 
 class EnrollmentViewSet(ModelViewSet):
@@ -465,6 +553,38 @@ class EnrollmentViewSet(ModelViewSet):
             return serializers.ReadEnrollmentSerializer
         return serializers.EnrollmentSerializer
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        with transaction.atomic():
+            if registration.holds_seat(data.get('status', models.Enrollment.PENDING)):
+                serializer.save(**registration.seat_or_waitlist(data['section'].id, data['semester'].id))
+            else:
+                serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        enrollment = self.get_object()
+        serializer = self.get_serializer(enrollment, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        old = (enrollment.section_id, enrollment.semester_id, enrollment.status)
+        new = (data['section'].id if 'section' in data else old[0],
+               data['semester'].id if 'semester' in data else old[1], data.get('status', old[2]))
+        try:
+            with transaction.atomic():
+                serializer.save(**registration.move_seat(old, new))
+        except registration.SectionFullError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(serializer.data)
+
+    @transaction.atomic()
+    def perform_destroy(self, instance):
+        if registration.holds_seat(instance.status):
+            registration.free_seats(instance.section_id, instance.semester_id)
+        instance.delete()
+
     def get_queryset(self):
         student_id = self.kwargs['students_pk']
         try:
@@ -480,6 +600,64 @@ class EnrollmentViewSet(ModelViewSet):
         return student_enrollments
 
 
+class BulkEnrollmentViewSet(Permission):
+    """
+    Enrolls many students in the current semester at once. Expects a list of
+    {"student", "course", "section", "has_scholarship"} and answers with a result per item.
+    """
+    http_method_names = ['post']
+    queryset = models.Enrollment.objects.all()
+
+    def create(self, request, *args, **kwargs):
+        serializer = serializers.BulkEnrollmentItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        semester = models.Semester.objects.filter(id=semesters.current_semester_id()).first()
+        if not semester:
+            return Response({'error': 'There is no current semester'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            results = registration.bulk_enroll(serializer.validated_data, semester)
+        except registration.BulkEnrollmentError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        created = sum(result['status'] == 'created' for result in results)
+        waitlisted = sum(result['status'] == 'waitlisted' for result in results)
+        failed = len(results) - created - waitlisted
+        if not created and not waitlisted:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({'created': created, 'waitlisted': waitlisted, 'failed': failed, 'results': results},
+                        status=response_status)
+
+
+class EnrollmentTransitionViewSet(Permission):
+    """
+    Approves or cancels many enrollments at once, chosen by {"ids"} and/or the
+    section, course, semester and student filters, e.g. {"action": "approve", "section": 3}.
+    Enrollments whose status does not allow the transition are skipped.
+    """
+    http_method_names = ['post']
+    queryset = models.Enrollment.objects.all()
+
+    def get_permissions(self):
+        return [permissions.BulkUpdateModelPermission()]
+
+    def create(self, request, *args, **kwargs):
+        serializer = serializers.EnrollmentTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        enrollments = models.Enrollment.objects.filter(**{
+            f'{name}_id': data[name] for name in serializer.FILTERS if name in data})
+        if 'ids' in data:
+            enrollments = enrollments.filter(id__in=data['ids'])
+        counts = registration.transition_enrollments(enrollments, serializer.ACTIONS[data['action']])
+        return Response(counts)
+
+
 class StudentEligibleCourseViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     http_method_names = ['get']
@@ -519,40 +697,64 @@ class StudentEligibleCourseViewSet(ModelViewSet):
 
     def get_queryset(self):
         student_id = self.kwargs['students_pk']
-        # You also have to ensure that the student has a passing mark for the prerequisite for that course.
 
         try:
             student_obj = models.Student.objects.get(user_id=student_id)
         except models.Student.DoesNotExist:
             return Response({'error': 'student does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-        department = student_obj.department
-        department_courses = department.courses.all()
-        current_courses = department_courses.filter(semesters__is_current=True)
+        current_courses = list(models.Course.objects.filter(
+            departments__id=student_obj.department_id, semesters=semesters.current_semester_id()).order_by('code'))
+        passed_courses = prerequisites.get_passed_course_ids(student_obj.user_id)
+        eligible_ids = prerequisites.get_graph().eligible_courses(
+            {course.id for course in current_courses}, passed_courses)
 
-        grades = student_obj.grades.all()
+        eligible_courses = [course for course in current_courses if course.id in eligible_ids]
+        prefetch_related_objects(eligible_courses, prefetch_section_seats())
+        return eligible_courses
 
-        completed_courses = [
-            g.course.code
-            for g in grades
-            if all(
-            sum(int(getattr(g, category)) > 0 for category in ['attendance', 'assignment', 'quiz', 'midterm', 'project', 'final'] >= 70)
-            )
-        ]
 
-        eligible_courses = []
+class EligibilityPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
 
-        for course in current_courses:
-            prerequisite = course.prerequisite
 
-            if not prerequisite and course.code not in completed_courses: #I modified this line
-                # If there's no prerequisite, the course is eligible
-                eligible_courses.append(course)
-            elif prerequisite.code in completed_courses:
-                # If there's a prerequisite and the student has passed it, the course is eligible
-                eligible_courses.append(course)
+class DepartmentEligibilityViewSet(Permission):
+    """
+    The eligible course ids of every student of a department, a page of students at a
+    time; narrow it to a major with ?major=. See the batch_eligibility command for a full run.
+    """
+    http_method_names = ['get']
+    pagination_class = EligibilityPagination
 
-        return eligible_courses
+    def get_queryset(self):
+        students = models.Student.objects.filter(department_id=self.kwargs['departments_pk'])
+        if self.request.query_params.get('major'):
+            students = students.filter(major_id=self.request.query_params['major'])
+        return students.order_by('student_number')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset().only('user_id', 'student_number'))
+        offered, rows = prerequisites.load_eligibility_inputs(
+            models.Student.objects.filter(user_id__in=[student.user_id for student in page]))
+        eligible = prerequisites.eligible_courses_of_students(prerequisites.get_graph(), offered, rows)
+        return self.get_paginated_response([
+            {'student': student.user_id, 'student_number': student.student_number,
+             'eligible_courses': eligible[student.user_id]}
+            for student in page
+        ])
+
+
+class CacheStatsViewSet(ModelViewSet):
+    """
+    Hit and miss counts of the per-student passed courses cache, for monitoring.
+    """
+    permission_classes = [IsAdminUser]
+    http_method_names = ['get']
+
+    def list(self, request, *args, **kwargs):
+        return Response({'passed_courses': prerequisites.get_passed_courses_stats()})
 
 
 class CurrentSemesterSectionEnrollmentViewSet(ModelViewSet):
@@ -569,7 +771,7 @@ class CurrentSemesterSectionEnrollmentViewSet(ModelViewSet):
             return Response({'error': "Section does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
         course_id = section_obj.course.id
-        curr_enrollments = models.Enrollment.objects.filter(course_id=course_id, section_id=section_obj.id, semester__is_current=True).\
+        curr_enrollments = models.Enrollment.objects.filter(course_id=course_id, section_id=section_obj.id, semester_id=semesters.current_semester_id()).\
             select_related('school_year', 'semester',
                            'course', 'student', 'section')
 
@@ -580,7 +782,7 @@ def prefetch_enrollments():
     prefetch_query = Prefetch(
         'section__enrollments',
         queryset=models.Enrollment.objects.filter(
-            Q(status='Approved') & Q(semester__is_current=True)
+            Q(status='Approved') & Q(semester_id=semesters.current_semester_id())
         ).select_related('student', 'course', 'semester', 'school_year', 'section'),
         to_attr='approved_enrollments'
     )
@@ -684,7 +886,7 @@ class OnlyCourseWithSectionViewSet(ModelViewSet):
 
     def get_queryset(self):
         queryset = models.Course.objects.filter(
-            semesters__is_current=True).prefetch_related('sections')
+            semesters=semesters.current_semester_id()).prefetch_related(prefetch_section_seats())
         return [course for course in queryset if course.sections.all()]
 
 
@@ -701,7 +903,7 @@ class TeacherAssignSectionViewSet(ModelViewSet):
         except models.Teacher.DoesNotExist:
             return Response({'error': 'Teacher does not exist'})
 
-        return models.Teach.objects.filter(teacher_id=teacher_id, semester__is_current=True).\
+        return models.Teach.objects.filter(teacher_id=teacher_id, semester_id=semesters.current_semester_id()).\
             select_related('course', 'section', 'school_year',
                            'semester', 'teacher')
 
@@ -731,35 +933,17 @@ class GradeViewSet(ModelViewSet):
 
         if serializer.is_valid(raise_exception=True):
             teach = teacher_obj.teaches.filter(
-                id=teach_id, semester__is_current=True).first()
+                id=teach_id, semester_id=semesters.current_semester_id()).first()
 
             if not teach:
                 return Response({'error': 'Teacher record does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-            grades_file = serializer.validated_data['excel_file']
-            try:
-                grades_file_rows = pd.read_excel(grades_file, header=None)
-                excluded_indexes = self.get_excluded_indexes()
-                students = self.get_grades_file_students_list(grades_file_rows, excluded_indexes)
-
-            except pd.errors.ParserError as e:
-                return Response({'error': f'Error reading the file: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-            except Exception as e:
-                return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            enrollments_list = self.get_enrollments_list(teach)
-            enrollments_list = [students for students in models.Student.objects.filter(user_id__in=enrollments_list).values_list('student_number', flat=True)]
-
-            if len(students) != len(enrollments_list):
-                return Response({'error': 'Incomplete students listing'}, status=status.HTTP_401_UNAUTHORIZED)
-
-            for student in students:
-                if student not in enrollments_list:
-                    return Response({'error': 'Unknown student found in spreadsheet'}, 
-                                    status=status.HTTP_403_FORBIDDEN)
-            self.create_grades(grades_file_rows, teach, excluded_indexes)
-            
-        return Response({'success': True}, status=status.HTTP_201_CREATED)
+            job = models.GradeImportJob.objects.create(
+                teach=teach, grades_file=serializer.validated_data['excel_file'],
+                mode=serializer.validated_data['mode'])
+            jobs.enqueue_grade_import(job)
+
+        return Response(serializers.GradeImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
     
     def get_teacher(self, teacher_id):
         try:
@@ -775,49 +959,174 @@ class GradeViewSet(ModelViewSet):
             return Response({'error': 'This section does not exist for the teacher'}, status=status.HTTP_404_NOT_FOUND)
         return id
 
-    def get_excluded_indexes(self):
-        semester_row = 0
-        school_year_row = 1
-        course_row = 2
-        section_row = 3
-        student_record_header = 4
-        excluded_indexes = [semester_row, school_year_row,
-                                    course_row, section_row, student_record_header]
-        return excluded_indexes
-                
-    def get_student_id(self, row):
-        try:
-            student = models.Student.objects.get(student_number=row.loc[0])
-        except models.Student.DoesNotExist:
-            return Response({'error': 'Student does not exist'}, status=status.HTTP_404_NOT_FOUND)
-        
-        return student.user.id    
-    
-    @transaction.atomic()
-    def create_grades(self, grades_file_rows, teach, excluded_indexes):
-        for index, row in grades_file_rows.iterrows():
-            if index not in excluded_indexes:
-                models.Grade.objects.create(
-                school_year_id=teach.school_year.id, semester_id=teach.semester.id, course_id=teach.course.id, 
-                section_id=teach.section.id, student_id=self.get_student_id(row), attendance=row.loc[1], assignment=row.loc[2], 
-                quiz=row.loc[3], midterm=row.loc[4], project=row.loc[5], final=row.loc[6])
-                
     def get_enrollments_list(self, teach):
-        enrollments = models.Enrollment.objects.filter(
-                course=teach.course, section=teach.section, semester__is_current=True).values_list('student', flat=True)
-        return list(enrollments)
-    
-    def get_grades_file_students_list(self, grades_file_rows, excluded_indexes):
-        students = []
-        for index, row in grades_file_rows.iterrows():
-            if index not in excluded_indexes:
-                try:
-                    students.append(row.loc[0])
-                except KeyError:
-                    pass
-        return students
+        """
+        Maps the student_number of every enrolled student to the student id.
+        """
+        return grading.get_roster(teach)
     
 
+class GradeImportJobViewSet(ModelViewSet):
+    """
+    Progress and outcome of the grade uploads of a teach.
+    """
+    http_method_names = ['get']
+    permission_classes = [IsAuthenticated]
+    serializer_class = serializers.GradeImportJobSerializer
+
+    def get_queryset(self):
+        return models.GradeImportJob.objects.filter(
+            teach_id=self.kwargs['teaches_pk'], teach__teacher_id=self.kwargs['teachers_pk']).order_by('-created_at')
+
+
+class GradeTemplateViewSet(ModelViewSet):
+    """
+    Downloads the grade upload sheet of a teach, pre-filled with its approved students.
+    With ?attendance=true the attendance column is filled in from the section's marks.
+    """
+    http_method_names = ['get']
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        teach = models.Teach.objects.filter(
+            id=self.kwargs['teaches_pk'], teacher_id=self.kwargs['teachers_pk'],
+            semester_id=semesters.current_semester_id())\
+            .select_related('course', 'section', 'semester', 'school_year').first()
+        if not teach:
+            return Response({'error': 'Teacher record does not exist'}, status=status.HTTP_404_NOT_FOUND)
+
+        rows = list(grading.get_roster_enrollments(teach).order_by('student__student_number').values_list(
+            'student_id', 'student__student_number', 'student__user__first_name', 'student__user__last_name'))
+        students = [row[1:] for row in rows]
+        attendance_scores = None
+        if request.query_params.get('attendance') == 'true':
+            summary = attendance.get_attendance_summary(teach.section_id, teach.semester_id)
+            attendance_scores = {student_number: summary[student_id]['score']
+                                 for student_id, student_number, *_ in rows if student_id in summary}
+
+        # Keyed on the roster itself, so the cached sheet is rebuilt whenever a student is added or dropped.
+        roster_digest = hashlib.sha1(repr((students, attendance_scores)).encode()).hexdigest()
+        cache_key = f'grade-template:{teach.id}:{roster_digest}'
+        content = cache.get(cache_key)
+        if content is None:
+            content = gradesheets.write_grade_template(teach, students, attendance_scores)
+            cache.set(cache_key, content, timeout=60 * 60 * 24)
+
+        response = HttpResponse(
+            content, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename="{teach.course.code}-{teach.section.name}-template.xlsx"'
+        return response
+
+
+def gradebook_response(grades, file_format, filename):
+    """
+    Streams a gradebook as CSV, or as an XLSX file which has to be fully written before it can be sent.
+    """
+    if file_format == 'xlsx':
+        return FileResponse(gradesheets.write_gradebook_xlsx(grades), as_attachment=True,
+                            filename=f'{filename}.xlsx')
+    response = StreamingHttpResponse(gradesheets.stream_gradebook_csv(grades), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+class TeachGradeExportViewSet(Permission):
+    """
+    Downloads the gradebook of a teach, use ?file_format=xlsx for a spreadsheet instead of CSV.
+    """
+    http_method_names = ['get']
+    queryset = models.Grade.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        teach = models.Teach.objects.filter(id=self.kwargs['teaches_pk'], teacher_id=self.kwargs['teachers_pk'])\
+            .select_related('course', 'section').first()
+        if not teach:
+            return Response({'error': 'Record does not exist'}, status=status.HTTP_404_NOT_FOUND)
+
+        grades = models.Grade.objects.filter(
+            course_id=teach.course_id, section_id=teach.section_id, semester_id=teach.semester_id)
+        filename = f'{teach.course.code}-{teach.section.name}-grades'
+        return gradebook_response(grades, request.query_params.get('file_format'), filename)
+
+
+class SemesterGradeExportViewSet(Permission):
+    """
+    Downloads every grade of a semester, optionally narrowed with ?course= and ?section=.
+    Use ?file_format=xlsx for a spreadsheet instead of CSV.
+    """
+    http_method_names = ['get']
+    queryset = models.Grade.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        try:
+            semester = models.Semester.objects.select_related('school_year').get(id=self.kwargs['semesters_pk'])
+        except models.Semester.DoesNotExist:
+            return Response({'error': 'Semester does not exist'}, status=status.HTTP_404_NOT_FOUND)
+
+        grades = models.Grade.objects.filter(semester_id=semester.id)
+        if request.query_params.get('course'):
+            grades = grades.filter(course_id=request.query_params['course'])
+        if request.query_params.get('section'):
+            grades = grades.filter(section_id=request.query_params['section'])
+
+        filename = f'{semester.school_year.year}-{semester.name}-grades'
+        return gradebook_response(grades, request.query_params.get('file_format'), filename)
+
+
+class AcademicSummaryViewSet(Permission):
+    """
+    Students ranked by cumulative GPA, e.g. ?gpa__gte=3.5 for the dean's list or
+    ?gpa__lte=1.99 for probation checks.
+    """
+    http_method_names = ['get']
+    queryset = models.StudentAcademicSummary.objects.select_related('student__user')
+    serializer_class = serializers.AcademicSummarySerializer
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = filters.AcademicSummaryFilter
+    ordering_fields = ['gpa', 'earned_credits', 'attempted_credits']
+    ordering = ['-gpa']
+
+
+class SemesterSummaryViewSet(Permission):
+    """
+    Students ranked by their GPA in a semester.
+    """
+    http_method_names = ['get']
+    serializer_class = serializers.SemesterSummarySerializer
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = filters.SemesterSummaryFilter
+    ordering_fields = ['gpa', 'earned_credits', 'attempted_credits']
+    ordering = ['-gpa']
+
+    def get_queryset(self):
+        return models.StudentSemesterSummary.objects.filter(
+            semester_id=self.kwargs['semesters_pk']).select_related('student__user')
+
+
+class GradeStatisticsViewSet(Permission):
+    """
+    Score distribution of a course in a semester: ?course= is required, add ?section= for a single section.
+    """
+    http_method_names = ['get']
+    queryset = models.Grade.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        semester_id = self.kwargs['semesters_pk']
+        try:
+            course_id = int(request.query_params['course'])
+            section_id = int(request.query_params['section']) if request.query_params.get('section') else None
+        except (KeyError, ValueError):
+            return Response({'error': 'A numeric course query parameter is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not models.Semester.objects.filter(id=semester_id, courses__id=course_id).exists():
+            return Response({'error': 'Course is not offered in this semester'}, status=status.HTTP_404_NOT_FOUND)
+        if section_id and not models.Section.objects.filter(id=section_id, course_id=course_id).exists():
+            return Response({'error': 'Section does not exist for the course'}, status=status.HTTP_404_NOT_FOUND)
+
+        statistics = analytics.get_statistics(course_id, semester_id, section_id)
+        return Response({'semester': int(semester_id), 'course': course_id, 'section': section_id, **statistics})
+
+
 class StudentGradeAccessViewSet(ModelViewSet):
     """
     Returns all grades for a student more like a transcript
@@ -830,9 +1139,22 @@ class StudentGradeAccessViewSet(ModelViewSet):
             student = models.Student.objects.get(user_id=self.kwargs['students_pk'])
         except models.Student.DoesNotExist:
             return Response({'error': 'Student does not exist'}, status=status.HTTP_404_NOT_FOUND)
-        return models.Grade.objects.filter(student_id=student.user.id).select_related('student', 'school_year', 'semester', 'course', 'section')
+        return models.Grade.objects.filter(student_id=student.user.id).select_related('student__user', 'school_year', 'semester', 'course', 'section')
         
 
+class StudentTranscriptViewSet(ModelViewSet):
+    """
+    Semester, yearly and cumulative GPA and credits of a student, computed in the database.
+    """
+    http_method_names = ['get']
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        if not models.Student.objects.filter(user_id=self.kwargs['students_pk']).exists():
+            return Response({'error': 'Student does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(grading.build_transcript(self.kwargs['students_pk']))
+
+
 class TeacherTeachGradeViewSet(ModelViewSet):
     http_method_names = ['get']
     serializer_class = serializers.ReadGradeSerializer